@@ -0,0 +1,70 @@
+"""
+Authentication overhead per request of simplejwt's `JWTAuthentication` and
+`users.authentication.CachedJWTAuthentication`.
+
+    python -m benchmarks.auth_overhead --requests 2000
+
+Runs against the configured database: a throwaway user is created in a
+transaction that is rolled back at the end.
+"""
+
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    django.setup()
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from users.authentication import CachedJWTAuthentication
+    from users.cache import get_user_cache_stats, reset_user_cache
+    from users.models import User
+
+    with transaction.atomic():
+        user = User.objects.create_user(
+            email="auth-benchmark@example.com",
+            password="benchmark",
+            first_name="Auth",
+            last_name="Benchmark",
+            phone="+48999999999",
+        )
+        token = AccessToken.for_user(user)
+        request = Request(
+            APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        )
+        reset_user_cache()
+
+        for name, authentication in [
+            ("JWTAuthentication", JWTAuthentication()),
+            ("CachedJWTAuthentication", CachedJWTAuthentication()),
+        ]:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(args.requests):
+                    authentication.authenticate(request)
+                elapsed = time.perf_counter() - started
+            print(
+                f"{name:<24} {elapsed / args.requests * 1e6:8.1f} us/request "
+                f"{len(queries) / args.requests:5.2f} queries/request"
+            )
+        print(f"user cache: {get_user_cache_stats()}")
+
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Minimal closed-loop HTTP load generator, no dependencies beyond the stdlib.
+
+    python -m benchmarks.http_load http://localhost/media/flowers/<name>.png \\
+        --concurrency 50 --duration 20
+
+Every client keeps one persistent connection and sends the next request as
+soon as the previous response has been read.
+"""
+
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+
+@dataclass
+class LoadResult:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    bytes_received: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    def percentile(self, percent: float) -> float:
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, round(percent / 100 * (len(latencies) - 1)))
+        return latencies[index]
+
+    def report(self) -> str:
+        return "\n".join(
+            [
+                f"requests:    {self.requests} ({self.errors} errors)",
+                f"throughput:  {self.requests / self.elapsed:.1f} req/s, "
+                f"{self.bytes_received / self.elapsed / 2**20:.1f} MiB/s",
+                f"latency p50: {self.percentile(50) * 1000:.1f} ms",
+                f"latency p99: {self.percentile(99) * 1000:.1f} ms",
+                f"latency avg: {statistics.fmean(self.latencies or [0]) * 1000:.1f} ms",
+            ]
+        )
+
+
+def run_load(
+    urls: list[str],
+    concurrency: int,
+    duration: float,
+    headers: dict[str, str] | None = None,
+    method: str = "GET",
+    body: bytes | None = None,
+) -> LoadResult:
+    result = LoadResult()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset: int) -> None:
+        connection = None
+        i = offset
+        while time.perf_counter() < deadline:
+            url = urlsplit(urls[i % len(urls)])
+            i += 1
+            path = url.path + (f"?{url.query}" if url.query else "")
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection_class = (
+                        http.client.HTTPSConnection
+                        if url.scheme == "https"
+                        else http.client.HTTPConnection
+                    )
+                    connection = connection_class(url.netloc, timeout=30)
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                size = len(response.read())
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                connection, size, ok = None, 0, False
+
+            latency = time.perf_counter() - start
+            with lock:
+                if ok:
+                    result.latencies.append(latency)
+                    result.bytes_received += size
+                else:
+                    result.errors += 1
+
+    threads = [
+        threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("urls", nargs="+", help="URLs requested round-robin.")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds.")
+    parser.add_argument(
+        "--header", action="append", default=[], help='Extra header, "Name: value".'
+    )
+    args = parser.parse_args()
+
+    headers = dict(header.split(": ", 1) for header in args.header)
+    print(run_load(args.urls, args.concurrency, args.duration, headers).report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Catalog latency while a storm of sign-ins hashes passwords.
+
+    python -m benchmarks.login_storm http://localhost \\
+        --email user@mail.com --password secret --concurrency 20 --logins 50
+
+Measures the catalog alone first, then together with `--logins` clients
+posting to the login endpoint as fast as they can. With the hashing pool
+(`PASSWORD_HASHING_WORKERS`, `PASSWORD_HASHING_QUEUE`) catalog p99 should barely
+move, excess sign-ins getting a fast 503 counted as errors.
+"""
+
+import argparse
+import json
+import threading
+
+from benchmarks.http_load import LoadResult, run_load
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("base_url", help="e.g. http://localhost")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=20, help="Catalog clients.")
+    parser.add_argument("--logins", type=int, default=50, help="Login clients.")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds.")
+    args = parser.parse_args()
+
+    catalog = [
+        f"{args.base_url}/api/flowers/",
+        f"{args.base_url}/api/bouquets/",
+        f"{args.base_url}/api/categories/",
+    ]
+    login = [f"{args.base_url}/api/users/login/"]
+    body = json.dumps({"email": args.email, "password": args.password}).encode()
+
+    print("catalog alone")
+    print(run_load(catalog, args.concurrency, args.duration).report())
+
+    logins = LoadResult()
+
+    def storm() -> None:
+        nonlocal logins
+        logins = run_load(
+            login,
+            args.logins,
+            args.duration,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+            body=body,
+        )
+
+    thread = threading.Thread(target=storm)
+    thread.start()
+    during = run_load(catalog, args.concurrency, args.duration)
+    thread.join()
+
+    print("\ncatalog during the login storm")
+    print(during.report())
+    print("\nlogins (errors include the 503 of a saturated hashing pool)")
+    print(logins.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Render time of a large bouquet list with DRF's `JSONRenderer` and the
+orjson based `FastJSONRenderer`.
+
+    python -m benchmarks.render_json --bouquets 500 --repeat 20
+
+The payload has the shape of `BouquetSerializer` output, including the raw
+`UUID` primary keys of `FlowerSerializer.bouquets`.
+"""
+
+import argparse
+import os
+import timeit
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+
+def build_bouquets(count: int) -> list[dict]:
+    created_at = datetime(2025, 12, 1, tzinfo=timezone.utc)
+    bouquet_ids = [uuid4() for _ in range(count)]
+    categories = [
+        {"id": str(uuid4()), "name": name, "bouquet_count": count // 3}
+        for name in ["Miłość", "Urodziny", "Ślub"]
+    ]
+
+    def flower(i: int) -> dict:
+        return {
+            "id": str(uuid4()),
+            "name": f"Róża {i}",
+            "price": f"{i % 50 + 0.5:.2f}",
+            "description": "Świeże kwiaty prosto z ogrodu " * 4,
+            "created_at": (created_at + timedelta(seconds=i)).isoformat(),
+            "image": f"http://localhost/media/flowers/{uuid4()}.png",
+            "srcset": {},
+            "in_stock": True,
+            "can_be_sold_separately": bool(i % 2),
+            "bouquets": bouquet_ids[i % count : i % count + 3],
+        }
+
+    return [
+        {
+            "id": str(bouquet_id),
+            "name": f"Bukiet {i}",
+            "price": f"{i % 300 + 0.99:.2f}",
+            "description": "Bukiet na każdą okazję " * 8,
+            "created_at": (created_at + timedelta(minutes=i)).isoformat(),
+            "image": f"http://localhost/media/bouquets/{uuid4()}.png",
+            "srcset": {},
+            "is_available": True,
+            "categories": categories[: i % 3 + 1],
+            "flowers": [flower(i * 5 + j) for j in range(5)],
+        }
+        for i, bouquet_id in enumerate(bouquet_ids)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--bouquets", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    django.setup()
+    from rest_framework.renderers import JSONRenderer
+
+    from core.renderers import FastJSONRenderer
+
+    data = {"next": None, "previous": None, "results": build_bouquets(args.bouquets)}
+    baseline, fast = JSONRenderer(), FastJSONRenderer()
+    assert baseline.render(data) == fast.render(data), "outputs differ"
+
+    size = len(baseline.render(data))
+    print(f"payload: {args.bouquets} bouquets, {size / 1024:.0f} KiB")
+    for name, renderer in [("JSONRenderer", baseline), ("FastJSONRenderer", fast)]:
+        best = min(
+            timeit.repeat(lambda: renderer.render(data), number=1, repeat=args.repeat)
+        )
+        print(f"{name:<17} {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Catalog and profile throughput and latency of the WSGI and ASGI deployments.
+
+    python -m benchmarks.wsgi_vs_asgi http://wsgi-host:8000 http://asgi-host:8000 \\
+        --token <access token> --concurrency 200 --duration 30
+
+Start the same code twice, e.g. `SERVER_INTERFACE=wsgi` and
+`SERVER_INTERFACE=asgi` in docker-compose, with `RATE_LIMIT_CATALOG` and
+`RATE_LIMIT_USER_DETAIL` raised well above the request rate, since every client
+shares one IP. Both servers are loaded in turn with the same closed-loop
+clients of `benchmarks.http_load`, requesting the catalog lists, the public
+profile of the token's user and, with `--token`, the own profile.
+"""
+
+import argparse
+import base64
+import json
+
+from benchmarks.http_load import run_load
+
+CATALOG_PATHS = ["/api/flowers/", "/api/bouquets/", "/api/categories/"]
+
+
+def token_user_id(token: str) -> str:
+    payload = token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))[
+        "user_id"
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("wsgi_url", help="e.g. http://localhost:8001")
+    parser.add_argument("asgi_url", help="e.g. http://localhost:8002")
+    parser.add_argument("--token", help="Access token, adds the profile endpoints.")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds.")
+    args = parser.parse_args()
+
+    paths, headers = list(CATALOG_PATHS), {}
+    if args.token:
+        paths += ["/api/users/profile/", f"/api/users/{token_user_id(args.token)}/"]
+        headers["Authorization"] = f"Bearer {args.token}"
+
+    results = {}
+    for name, base_url in [("wsgi", args.wsgi_url), ("asgi", args.asgi_url)]:
+        urls = [f"{base_url.rstrip('/')}{path}" for path in paths]
+        results[name] = run_load(urls, args.concurrency, args.duration, headers)
+        print(f"{name} ({base_url})")
+        print(results[name].report(), end="\n\n")
+
+    print(f"{'':6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:6}{result.requests / result.elapsed:10.1f}"
+            f"{result.percentile(50) * 1000:10.1f}{result.percentile(99) * 1000:10.1f}"
+            f"{result.errors:8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import mimetypes
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse
+from django.utils._os import safe_join
+from django.utils.functional import cached_property
+
+
+class ProtectedMediaStorage(FileSystemStorage):
+    """
+    Storage under `PROTECTED_MEDIA_ROOT` for files only served through
+    `protected_media_response`, for `FileField(storage=...)`.
+    """
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.PROTECTED_MEDIA_ROOT)
+
+    @cached_property
+    def base_url(self):
+        return self._value_or_setting(self._base_url, settings.PROTECTED_MEDIA_URL)
+
+
+def protected_media_response(name: str) -> HttpResponse:
+    """
+    Response serving the `ProtectedMediaStorage` file `name` after the caller
+    has done its permission checks. Behind nginx only the `X-Accel-Redirect`
+    header is sent and nginx streams the file from its internal
+    `/protected-media/` location.
+    """
+    # Raises SuspiciousFileOperation for names escaping PROTECTED_MEDIA_ROOT
+    path = safe_join(settings.PROTECTED_MEDIA_ROOT, name)
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = f"{settings.PROTECTED_MEDIA_URL}{quote(name)}"
+        return response
+
+    return FileResponse(open(path, "rb"), content_type=content_type)
@@ -0,0 +1,34 @@
+import math
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+class RateLimitHeadersMiddleware:
+    """
+    `RateLimit-Limit`, `RateLimit-Remaining` and `RateLimit-Reset` headers for
+    requests limited by `core.throttling.TokenBucketThrottle`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.add_headers(request, await self.get_response(request))
+
+    def add_headers(self, request, response):
+        decision = getattr(request, "rate_limit", None)
+        if decision is not None:
+            response["RateLimit-Limit"] = str(decision.limit)
+            response["RateLimit-Remaining"] = str(decision.remaining)
+            response["RateLimit-Reset"] = str(math.ceil(decision.reset))
+        return response
@@ -0,0 +1,182 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination over a composite, strictly unique ordering.
+
+    DRF's `CursorPagination` only filters on the first ordering field and falls
+    back to an OFFSET for rows sharing the same position. Here the cursor keeps
+    the values of every ordering field (the last one being the primary key), so
+    each page is a plain keyset seek over the matching composite index and page N
+    costs the same as page 1.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """`paginate_queryset` fetching the page with the async ORM."""
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([obj async for obj in queryset])
+
+    def get_page_queryset(self, queryset, request, view=None) -> QuerySet | None:
+        """The rows of the requested page plus one, to tell if there is a next page."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            _, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = self._seek(queryset, current_position, reverse)
+
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, results: list) -> list:
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            _, reverse, current_position = self.cursor
+
+        self.page = results[: self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                self.page[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = (
+                    self._get_position_from_instance(self.page[-1], self.ordering)
+                    if self.page
+                    else current_position
+                )
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = (
+                    self._get_position_from_instance(self.page[0], self.ordering)
+                    if self.page
+                    else current_position
+                )
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self._encode_position(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self._encode_position(self.previous_position, reverse=True)
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+        if (
+            not isinstance(position, list)
+            or len(position) != len(self.ordering)
+            or not all(isinstance(value, str) for value in position)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+        return cursor._replace(position=position)
+
+    def _encode_position(self, position: list[str], reverse: bool) -> str:
+        cursor = Cursor(offset=0, reverse=reverse, position=json.dumps(position))
+        return self.encode_cursor(cursor)
+
+    def _get_position_from_instance(self, instance, ordering) -> list[str]:
+        position = []
+        for order in ordering:
+            field_name = order.lstrip("-")
+            if isinstance(instance, dict):
+                attr = instance[field_name]
+            else:
+                attr = getattr(instance, field_name)
+            position.append(str(attr))
+        return position
+
+    def _seek(self, queryset: QuerySet, position: list[str], reverse: bool) -> QuerySet:
+        """
+        Expand `(a, b, c) > (x, y, z)` into
+        `a >= x AND (a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z))`,
+        honouring the direction of each ordering field. Postgres can't turn the
+        OR alone into an index range and would filter every row before the
+        cursor, the redundant `a >= x` gives it the start of the range.
+        """
+        condition = Q()
+        equal_prefix = Q()
+        for order, value in zip(self.ordering, position):
+            field_name = order.lstrip("-")
+            lookup = "lt" if order.startswith("-") != reverse else "gt"
+            condition |= equal_prefix & Q(**{f"{field_name}__{lookup}": value})
+            equal_prefix &= Q(**{field_name: value})
+
+        first_order, first_value = self.ordering[0], position[0]
+        lookup = "lte" if first_order.startswith("-") != reverse else "gte"
+        leading_bound = Q(**{f"{first_order.lstrip('-')}__{lookup}": first_value})
+
+        try:
+            return queryset.filter(leading_bound & condition)
+        except (ValidationError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class NameCursorPagination(KeysetCursorPagination):
+    ordering = ("name", "id")
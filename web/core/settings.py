@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "phonenumber_field",
     "drf_spectacular",
@@ -39,10 +40,15 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.RateLimitHeadersMiddleware",
 ]
 
 ROOT_URLCONF = "core.urls"
 
+# "wsgi" or "asgi", the entry point gunicorn serves (see docker-compose.yml).
+# Under ASGI the catalog and profile reads are served by async views
+SERVER_INTERFACE = os.getenv("SERVER_INTERFACE", "wsgi")
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -69,10 +75,49 @@ DATABASES = {
         "PASSWORD": os.environ["POSTGRES_PASSWORD"],
         "HOST": os.environ["POSTGRES_HOST"],
         "PORT": os.environ["POSTGRES_PORT"],
+        # Under ASGI every in-flight request runs its queries on a thread of its
+        # own, the pool bounds the connections of a process and makes requests
+        # wait for one instead of exhausting the server's `max_connections`
+        "OPTIONS": {
+            "pool": {
+                "min_size": 2,
+                "max_size": int(os.getenv("DB_POOL_SIZE", 20)),
+                "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+            },
+        },
     }
 }
 
+if REDIS_URL := os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 60 * 60))
+
 AUTH_USER_MODEL = "users.User"
+AUTHENTICATION_BACKENDS = ["users.backends.HashingPoolModelBackend"]
+# scrypt is memory-hard, hashes of the other hashers are upgraded to it on
+# sign-in
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+# Threads hashing passwords per process, and how many more sign-ins may wait
+# for one before the next gets a 503
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", 2))
+PASSWORD_HASHING_QUEUE = int(os.getenv("PASSWORD_HASHING_QUEUE", 4))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -96,6 +141,13 @@ LANGUAGES = [
 
 LANGUAGE_CODE = "pl"
 
+# Postgres text search configuration per language. Postgres ships no Polish
+# stemmer, point "pl" to a custom hunspell-based configuration once installed.
+SEARCH_CONFIGS = {
+    "pl": "simple",
+    "en": "english",
+}
+
 TIME_ZONE = os.environ["TZ"]
 
 USE_I18N = True
@@ -107,18 +159,102 @@ STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Files behind a permission check, see `core.media.ProtectedMediaStorage`. Kept
+# out of MEDIA_ROOT, which nginx serves to anyone
+PROTECTED_MEDIA_ROOT = BASE_DIR / "protected-media"
+# Served by nginx, see nginx/conf.d/default.conf
+MEDIA_ACCEL_REDIRECT = bool(int(os.getenv("MEDIA_ACCEL_REDIRECT", "0")))
+PROTECTED_MEDIA_URL = "/protected-media/"
+
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", 2))
+
+# Gateway `/pay/` charges through, see `orders.payments`
+PAYMENT_PROVIDER = os.getenv("PAYMENT_PROVIDER", "orders.payments.LocalGatewayProvider")
+# Call the provider inline instead of on the payment thread pool (tests)
+PAYMENT_PROVIDER_EAGER = False
+PAYMENT_PROVIDER_WORKERS = int(os.getenv("PAYMENT_PROVIDER_WORKERS", 8))
+PAYMENT_PROVIDER_TIMEOUT = float(os.getenv("PAYMENT_PROVIDER_TIMEOUT", 10))
+PAYMENT_PROVIDER_RETRIES = int(os.getenv("PAYMENT_PROVIDER_RETRIES", 3))
+PAYMENT_PROVIDER_BACKOFF = float(os.getenv("PAYMENT_PROVIDER_BACKOFF", 0.5))
+PAYMENT_WEBHOOK_SECRET = os.getenv("PAYMENT_WEBHOOK_SECRET", SECRET_KEY)
+LOCAL_GATEWAY_OUTCOME = os.getenv("LOCAL_GATEWAY_OUTCOME", "completed")
+LOCAL_GATEWAY_DELAY = float(os.getenv("LOCAL_GATEWAY_DELAY", 1))
+
+# How long stock stays reserved for an order being paid, in seconds. Must be
+# longer than the provider needs, timeouts and retries included
+STOCK_RESERVATION_TTL = int(os.getenv("STOCK_RESERVATION_TTL", 30 * 60))
+
+# How long a stored `Idempotency-Key` result is replayed, in seconds
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+
+# Open carts untouched for this long are swept, in seconds
+ABANDONED_CART_AGE = int(os.getenv("ABANDONED_CART_AGE", 30 * 24 * 60 * 60))
+
+# Users resolved by `CachedJWTAuthentication`: entries kept per process, and
+# for how long in seconds, and how long in the shared cache. Changes apply
+# at once through the user's version in the shared cache, see `users.cache`
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10_000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
+USER_CACHE_SHARED_TTL = int(os.getenv("USER_CACHE_SHARED_TTL", 10 * 60))
+
+# Revoked tokens filter of every worker (`users.revocation`): expected number
+# of live revoked tokens and false positive rate, the extra query of a false
+# positive is rare as long as the capacity is not exceeded. New revocations
+# reach the other workers within the sync interval, in seconds
+TOKEN_REVOCATION_CAPACITY = int(os.getenv("TOKEN_REVOCATION_CAPACITY", 100_000))
+TOKEN_REVOCATION_ERROR_RATE = float(os.getenv("TOKEN_REVOCATION_ERROR_RATE", 0.001))
+TOKEN_REVOCATION_SYNC_INTERVAL = float(os.getenv("TOKEN_REVOCATION_SYNC_INTERVAL", 5))
+TOKEN_REVOCATION_REBUILD_INTERVAL = float(
+    os.getenv("TOKEN_REVOCATION_REBUILD_INTERVAL", 60 * 60)
+)
+
+# Token buckets of `core.throttling.TokenBucketThrottle`, by view
+# `throttle_scope`: "<burst>/<second|minute|hour|day>", refilled evenly over
+# the period. `SharedMemoryBucketStore` is shared by the workers of one host,
+# `RedisBucketStore` by every host
+RATE_LIMITS = {
+    "catalog": os.getenv("RATE_LIMIT_CATALOG", "300/minute"),
+    "register": os.getenv("RATE_LIMIT_REGISTER", "10/hour"),
+    "login": os.getenv("RATE_LIMIT_LOGIN", "10/minute"),
+    "user-detail": os.getenv("RATE_LIMIT_USER_DETAIL", "60/minute"),
+}
+RATE_LIMIT_STORE = os.getenv(
+    "RATE_LIMIT_STORE", "core.throttling.SharedMemoryBucketStore"
+)
+RATE_LIMIT_SHM_NAME = os.getenv("RATE_LIMIT_SHM_NAME", "flowers24-ratelimit")
+RATE_LIMIT_SHM_SLOTS = int(os.getenv("RATE_LIMIT_SHM_SLOTS", 65_536))
+RATE_LIMIT_REDIS_URL = os.getenv(
+    "RATE_LIMIT_REDIS_URL", REDIS_URL or "redis://localhost:6379/1"
+)
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
+    ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "core.throttling.TokenBucketThrottle",
     ],
+    # Proxies in front of gunicorn, nginx only. The client IP the throttles
+    # limit is the one the last proxy appended to `X-Forwarded-For`, the entries
+    # before it are sent by the client and can be anything
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", 1)),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=7),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=30),
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.TokenRefreshSerializer",
 }
 
 SPECTACULAR_SETTINGS = {
@@ -0,0 +1,188 @@
+import importlib
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.test import SimpleTestCase, override_settings
+from django.urls import clear_url_caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+
+from core.media import ProtectedMediaStorage, protected_media_response
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+from core.throttling import SharedMemoryBucketStore, parse_rate
+from core.views import AsyncAPIView, interface_view
+
+
+def reload_urlconf():
+    for module in ["flowers.urls", "users.urls", "orders.urls", "core.urls"]:
+        importlib.reload(sys.modules[module])
+    clear_url_caches()
+
+
+class ServedThroughASGIMixin:
+    """Routes to the async views, as under `SERVER_INTERFACE=asgi`."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.asgi_settings = override_settings(SERVER_INTERFACE="asgi")
+        cls.asgi_settings.enable()
+        reload_urlconf()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.asgi_settings.disable()
+        reload_urlconf()
+
+
+class ProtectedMediaResponseTestCase(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        (Path(self.media_root) / "flowers").mkdir()
+        (Path(self.media_root) / "flowers" / "rose.png").write_bytes(b"png")
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_accel_redirect(self):
+        with self.settings(
+            PROTECTED_MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT=True
+        ):
+            response = protected_media_response("flowers/rose.png")
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/flowers/rose.png"
+        )
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response.content, b"")
+
+    def test_file_response_without_nginx(self):
+        with self.settings(
+            PROTECTED_MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT=False
+        ):
+            response = protected_media_response("flowers/rose.png")
+        self.assertEqual(b"".join(response.streaming_content), b"png")
+        response.close()
+
+    def test_storage_outside_public_media(self):
+        with self.settings(PROTECTED_MEDIA_ROOT=self.media_root):
+            name = ProtectedMediaStorage().save("invoices/1.pdf", BytesIO(b"pdf"))
+        self.assertTrue((Path(self.media_root) / name).is_file())
+        # nginx serves everything under MEDIA_ROOT to anyone
+        self.assertFalse(
+            Path(settings.PROTECTED_MEDIA_ROOT).is_relative_to(settings.MEDIA_ROOT)
+        )
+
+    def test_path_traversal(self):
+        with self.settings(
+            PROTECTED_MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT=True
+        ):
+            with self.assertRaises(SuspiciousFileOperation):
+                protected_media_response("../settings.py")
+
+
+class FastJSONTestCase(SimpleTestCase):
+    data = {
+        "id": uuid4(),
+        "bouquets": [uuid4(), uuid4()],
+        "price": "10.50",
+        "raw_price": Decimal("10.50"),
+        "created_at": datetime(2025, 12, 10, 21, 58, 1, 123456, tzinfo=timezone.utc),
+        "date": datetime(2025, 12, 10).date(),
+        "name": "Róża \u2028 \u2029 💐",
+        "label": _("Flower"),
+        "nested": [{"count": 3, "ratio": 0.1, "none": None, "flag": True}],
+        "tuple": (1, 2),
+    }
+
+    def test_renders_same_bytes_as_json_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+        )
+
+    def test_float_differences(self):
+        self.assertEqual(FastJSONRenderer().render([0.1, 1e16]), b"[0.1,1e16]")
+        self.assertEqual(JSONRenderer().render([0.1, 1e16]), b"[0.1,1e+16]")
+        self.assertEqual(FastJSONRenderer().render([1.5e-7]), b"[1.5e-7]")
+        self.assertEqual(JSONRenderer().render([1.5e-7]), b"[1.5e-07]")
+
+        self.assertEqual(FastJSONRenderer().render([float("nan")]), b"[null]")
+        with self.assertRaises(ValueError):
+            JSONRenderer().render([float("nan")])
+
+    def test_indent_falls_back(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, "application/json; indent=4"),
+            JSONRenderer().render(self.data, "application/json; indent=4"),
+        )
+
+    def test_parse(self):
+        body = JSONRenderer().render({"name": "Róża", "quantity": 3, "items": [1.5]})
+        self.assertEqual(
+            FastJSONParser().parse(BytesIO(body)),
+            {"name": "Róża", "quantity": 3, "items": [1.5]},
+        )
+
+    def test_parse_error(self):
+        for body in [b"{", b'{"a": NaN}']:
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(body))
+
+
+class InterfaceViewTestCase(SimpleTestCase):
+    def test_async_view_only_under_asgi(self):
+        class SyncView(APIView):
+            pass
+
+        class AsyncView(AsyncAPIView):
+            pass
+
+        self.assertIs(interface_view(SyncView, AsyncView).cls, SyncView)
+        with override_settings(SERVER_INTERFACE="asgi"):
+            self.assertIs(interface_view(SyncView, AsyncView).cls, AsyncView)
+
+
+class SharedMemoryBucketStoreTestCase(SimpleTestCase):
+    def setUp(self):
+        self.store = SharedMemoryBucketStore()
+        self.store.clear()
+
+    def test_bucket_empties_and_refills(self):
+        decisions = [self.store.consume("ip:1", 3, 100) for _ in range(4)]
+
+        self.assertEqual([d.allowed for d in decisions], [True, True, True, False])
+        self.assertEqual([d.remaining for d in decisions], [2, 1, 0, 0])
+        self.assertGreater(decisions[-1].retry_after, 0)
+        self.assertTrue(self.store.consume("ip:2", 3, 100).allowed)
+
+        time.sleep(decisions[-1].retry_after + 0.01)
+        self.assertTrue(self.store.consume("ip:1", 3, 100).allowed)
+
+    def test_buckets_shared_between_instances(self):
+        # Same file, as for the workers of one host
+        other = SharedMemoryBucketStore()
+        self.store.consume("user:1", 2, 0.01)
+        other.consume("user:1", 2, 0.01)
+        self.assertFalse(self.store.consume("user:1", 2, 0.01).allowed)
+
+    def test_decision_is_sub_millisecond(self):
+        started = time.perf_counter()
+        for i in range(1000):
+            self.store.consume(f"ip:{i % 50}", 100, 10)
+        self.assertLess((time.perf_counter() - started) / 1000, 0.001)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("120/minute"), (120, 2))
+        self.assertEqual(parse_rate("10/s"), (10, 10))
@@ -0,0 +1,211 @@
+import fcntl
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from hashlib import blake2b
+from threading import Lock
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the bucket is full again, and until the next token
+    reset: float
+    retry_after: float
+
+
+class BucketStore:
+    """
+    Token buckets by key. `consume` refills the bucket `key` (at most
+    `capacity` tokens, `rate` tokens per second), then takes one token if there
+    is one, atomically across every process sharing the store.
+    """
+
+    def consume(self, key: str, capacity: int, rate: float) -> Decision:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+def make_decision(allowed: bool, tokens: float, capacity: int, rate: float) -> Decision:
+    return Decision(
+        allowed=allowed,
+        limit=capacity,
+        remaining=math.floor(tokens),
+        reset=(capacity - tokens) / rate,
+        retry_after=0.0 if allowed else (1 - tokens) / rate,
+    )
+
+
+def refill(
+    tokens: float | None, updated: float, now: float, capacity: int, rate: float
+) -> tuple[float, Decision]:
+    """Token bucket step of `SharedMemoryBucketStore`, `RedisBucketStore.SCRIPT` in Lua."""
+    tokens = (
+        capacity if tokens is None else min(capacity, tokens + (now - updated) * rate)
+    )
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    return tokens, make_decision(allowed, tokens, capacity, rate)
+
+
+class SharedMemoryBucketStore(BucketStore):
+    """
+    Buckets in the memory-mapped file `RATE_LIMIT_SHM_NAME` under `/dev/shm`,
+    shared by the workers of one host. Restarts reuse the file, buckets
+    included. A fixed table of `RATE_LIMIT_SHM_SLOTS` slots with open
+    addressing: when the probed slots are taken, the least recently used one
+    is reused, so a full table forgets idle clients first.
+    """
+
+    SLOT = struct.Struct("<Qdd")  # key hash, tokens, last update
+    PROBES = 8
+
+    def __init__(self) -> None:
+        self.slots = settings.RATE_LIMIT_SHM_SLOTS
+        shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        path = os.path.join(shm_dir, settings.RATE_LIMIT_SHM_NAME)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.slots * self.SLOT.size
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.memory = mmap.mmap(self.fd, size)
+        # flock excludes other processes, the lock the threads of this one
+        self.lock = Lock()
+
+    def consume(self, key: str, capacity: int, rate: float) -> Decision:
+        digest = blake2b(key.encode(), digest_size=8).digest()
+        # 0 marks an empty slot
+        key_hash = int.from_bytes(digest, "little") or 1
+        start = key_hash % self.slots
+        with self.lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                slot, tokens, updated = self._find(key_hash, start)
+                tokens, decision = refill(tokens, updated, now, capacity, rate)
+                self.SLOT.pack_into(
+                    self.memory, slot * self.SLOT.size, key_hash, tokens, now
+                )
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return decision
+
+    def _find(self, key_hash: int, start: int) -> tuple[int, float | None, float]:
+        oldest, oldest_updated = start, math.inf
+        for probe in range(self.PROBES):
+            slot = (start + probe) % self.slots
+            stored_hash, tokens, updated = self.SLOT.unpack_from(
+                self.memory, slot * self.SLOT.size
+            )
+            if stored_hash == key_hash:
+                return slot, tokens, updated
+            if stored_hash == 0:
+                return slot, None, 0.0
+            if updated < oldest_updated:
+                oldest, oldest_updated = slot, updated
+        return oldest, None, 0.0
+
+    def clear(self) -> None:
+        with self.lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                self.memory[:] = bytes(len(self.memory))
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+class RedisBucketStore(BucketStore):
+    """
+    Buckets in Redis, or any server speaking its protocol, at
+    `RATE_LIMIT_REDIS_URL`, for limits shared by several hosts. One script
+    call per decision.
+    """
+
+    SCRIPT = """
+        local capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local time = redis.call("TIME")
+        local now = time[1] + time[2] / 1000000
+        local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+        local tokens = tonumber(bucket[1])
+        if tokens == nil then
+            tokens = capacity
+        else
+            tokens = math.min(capacity, tokens + (now - tonumber(bucket[2])) * rate)
+        end
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+        redis.call("PEXPIRE", KEYS[1], math.ceil(capacity / rate * 1000))
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self) -> None:
+        from redis import Redis
+
+        self.client = Redis.from_url(settings.RATE_LIMIT_REDIS_URL)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def consume(self, key: str, capacity: int, rate: float) -> Decision:
+        allowed, tokens = self.script(keys=[f"ratelimit:{key}"], args=[capacity, rate])
+        return make_decision(bool(allowed), float(tokens), capacity, rate)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter("ratelimit:*"):
+            self.client.delete(key)
+
+
+@lru_cache(maxsize=None)
+def get_bucket_store() -> BucketStore:
+    return import_string(settings.RATE_LIMIT_STORE)()
+
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """`"100/minute"` -> bucket of 100 tokens refilled at 100 / 60 tokens per second."""
+    count, period = rate.split("/")
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Limits views by their `throttle_scope`, with the rate of that scope in
+    `RATE_LIMITS`, per user or per client IP for anonymous requests. Views
+    without a scope are not limited. The decision is left on the request for
+    `core.middleware.RateLimitHeadersMiddleware`.
+    """
+
+    def allow_request(self, request, view) -> bool:
+        scope = getattr(view, "throttle_scope", None)
+        rate = settings.RATE_LIMITS.get(scope) if scope else None
+        if rate is None:
+            return True
+
+        if request.user and request.user.is_authenticated:
+            key = f"{scope}:user:{request.user.pk}"
+        else:
+            key = f"{scope}:ip:{self.get_ident(request)}"
+        self.decision = get_bucket_store().consume(key, *parse_rate(rate))
+        request._request.rate_limit = self.decision
+        return self.decision.allowed
+
+    def wait(self) -> float:
+        return self.decision.retry_after
@@ -0,0 +1,124 @@
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework import status
+from rest_framework.generics import GenericAPIView, ListAPIView, RetrieveAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class AsyncAPIViewMixin:
+    """
+    `APIView.dispatch` as a coroutine, so that views with `async def` handlers
+    are served on the event loop under ASGI, see `interface_view`.
+    Authentication, permissions and throttles stay synchronous and run in a
+    thread, as do sync handlers such as `options`.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncAPIView(AsyncAPIViewMixin, APIView):
+    pass
+
+
+class AsyncGenericAPIView(AsyncAPIViewMixin, GenericAPIView):
+    async def afilter_queryset(self, queryset):
+        # Filter backends may query, e.g. the in-process search index
+        if not self.filter_backends:
+            return queryset
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def apaginate_queryset(self, queryset) -> list | None:
+        if self.paginator is None:
+            return None
+        if hasattr(self.paginator, "apaginate_queryset"):
+            return await self.paginator.apaginate_queryset(
+                queryset, self.request, view=self
+            )
+        return await sync_to_async(self.paginator.paginate_queryset)(
+            queryset, self.request, view=self
+        )
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            obj = await queryset.aget(**filter_kwargs)
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404(
+                f"No {queryset.model._meta.object_name} matches the given query."
+            )
+
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class AsyncListAPIView(AsyncGenericAPIView, ListAPIView):
+    """`ListAPIView` reading its page with the async ORM."""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer([obj async for obj in queryset], many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class AsyncRetrieveAPIView(AsyncGenericAPIView, RetrieveAPIView):
+    """`RetrieveAPIView` reading its object with the async ORM."""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.aretrieve(request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def interface_view(view, async_view, **initkwargs):
+    """
+    `async_view` when served through ASGI (`SERVER_INTERFACE`), `view`
+    otherwise: under WSGI, Django would run every async view through
+    `async_to_sync`, an event loop hop per request.
+    """
+    if settings.SERVER_INTERFACE == "asgi":
+        return async_view.as_view(**initkwargs)
+    return view.as_view(**initkwargs)
@@ -15,13 +15,13 @@ class BouquetFlowerInline(admin.TabularInline):
 
 @admin.register(Bouquet)
 class BouquetAdmin(admin.ModelAdmin):
-    list_display = ["name"]
+    list_display = ["name", "is_available"]
     inlines = [BouquetFlowerInline]
 
 
 @admin.register(Flower)
 class FlowerAdmin(admin.ModelAdmin):
-    pass
+    list_display = ["name", "stock"]
 
 
 @admin.register(BouquetCategory)
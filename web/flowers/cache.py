@@ -0,0 +1,125 @@
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import get_language
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_HITS_KEY = "catalog:hits"
+CATALOG_MISSES_KEY = "catalog:misses"
+
+
+def _incr(key: str) -> int:
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key is missing (first use or evicted), seed it and retry
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+async def _aincr(key: str) -> int:
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, timeout=None)
+        return await cache.aincr(key)
+
+
+def get_catalog_version() -> int:
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+async def aget_catalog_version() -> int:
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version() -> int:
+    """
+    Invalidate every cached catalog response at once. Old entries are not
+    deleted, they simply become unreachable and expire on their own.
+    """
+    return _incr(CATALOG_VERSION_KEY)
+
+
+def get_catalog_cache_stats() -> dict[str, int]:
+    values = cache.get_many([CATALOG_VERSION_KEY, CATALOG_HITS_KEY, CATALOG_MISSES_KEY])
+    return {
+        "version": values.get(CATALOG_VERSION_KEY) or get_catalog_version(),
+        "hits": values.get(CATALOG_HITS_KEY, 0),
+        "misses": values.get(CATALOG_MISSES_KEY, 0),
+    }
+
+
+class CatalogCacheMixin:
+    """
+    Serve GET responses of catalog views from the cache until the catalog
+    version is bumped by one of the `flowers.signals` receivers.
+    """
+
+    def get_request_hash(self, request) -> str:
+        # Sorted query params, so that every filter combination maps to one entry
+        # regardless of the parameter order picked by the client
+        query = urlencode(sorted(request.GET.lists()), doseq=True)
+        return md5(
+            f"{request.build_absolute_uri(request.path)}?{query}|{get_language()}".encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+
+    def get_catalog_cache_key(self, request) -> str:
+        request_hash = self.get_request_hash(request)
+        version = get_catalog_version()
+        return f"catalog:{version}:{self.__class__.__name__}:{request_hash}"
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_catalog_cache_key(request)
+
+        data = cache.get(key)
+        if data is not None:
+            _incr(CATALOG_HITS_KEY)
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        _incr(CATALOG_MISSES_KEY)
+        response = super().get(request, *args, **kwargs)  # type: ignore
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        response["X-Cache"] = "MISS"
+        return response
+
+
+class AsyncCatalogCacheMixin(CatalogCacheMixin):
+    """
+    `CatalogCacheMixin` for the async views of `core.views`, through the async
+    cache API, so that a hit never leaves the event loop.
+    """
+
+    async def aget_catalog_cache_key(self, request) -> str:
+        request_hash = self.get_request_hash(request)
+        version = await aget_catalog_version()
+        return f"catalog:{version}:{self.__class__.__name__}:{request_hash}"
+
+    async def get(self, request, *args, **kwargs):
+        key = await self.aget_catalog_cache_key(request)
+
+        data = await cache.aget(key)
+        if data is not None:
+            await _aincr(CATALOG_HITS_KEY)
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        await _aincr(CATALOG_MISSES_KEY)
+        response = await super().get(request, *args, **kwargs)  # type: ignore
+        if response.status_code == status.HTTP_200_OK:
+            await cache.aset(key, response.data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        response["X-Cache"] = "MISS"
+        return response
@@ -0,0 +1,211 @@
+from decimal import Decimal
+from uuid import UUID
+
+from django.db.models import (
+    Case,
+    CharField,
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    QuerySet,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast
+from rest_framework.filters import BaseFilterBackend
+
+from flowers.models import Bouquet, BouquetFlower
+from flowers.search import search_queryset
+from flowers.serializers import BouquetFilterSerializer
+
+# (label, lower bound inclusive, upper bound exclusive)
+PRICE_BANDS: list[tuple[str, Decimal | None, Decimal | None]] = [
+    ("0-50", None, Decimal(50)),
+    ("50-100", Decimal(50), Decimal(100)),
+    ("100-200", Decimal(100), Decimal(200)),
+    ("200+", Decimal(200), None),
+]
+
+
+class CatalogSearchFilter(BaseFilterBackend):
+    """
+    Ranked full-text search over the view's `search_fields` with `?q=`. While
+    searching, results are ordered (and cursor-paginated) by rank.
+    """
+
+    search_param = "q"
+    max_length = 100
+
+    def get_search_query(self, request) -> str:
+        return request.query_params.get(self.search_param, "").strip()[
+            : self.max_length
+        ]
+
+    def filter_queryset(self, request, queryset, view):
+        if not (q := self.get_search_query(request)):
+            return queryset
+        return search_queryset(queryset, q, view.search_fields)
+
+    def get_ordering(self, request, queryset, view):
+        if self.get_search_query(request):
+            return ("-search_rank", "-id")
+        return None
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.search_param,
+                "required": False,
+                "in": "query",
+                "description": "Search term, results are ordered by relevance.",
+                "schema": {"type": "string"},
+            }
+        ]
+
+
+class BouquetFilter(BaseFilterBackend):
+    """
+    Bouquet filters: `?category=` and `?flower=` (repeatable, any of), `?price_min=`,
+    `?price_max=` and `?is_available=`. Also computes facet counts, where each
+    facet ignores its own filter so that clients can offer the other values.
+    """
+
+    list_params = ["category", "flower"]
+
+    def get_filters(self, request) -> dict[str, Q]:
+        data = {}
+        for param in request.query_params:
+            if param in self.list_params:
+                data[param] = request.query_params.getlist(param)
+            else:
+                data[param] = request.query_params[param]
+
+        serializer = BouquetFilterSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        filters = {}
+        if categories := params.get("category"):
+            filters["category"] = Q(
+                Exists(
+                    Bouquet.categories.through.objects.filter(
+                        bouquet_id=OuterRef("pk"), bouquetcategory_id__in=categories
+                    )
+                )
+            )
+        if flowers := params.get("flower"):
+            filters["flower"] = Q(
+                Exists(
+                    BouquetFlower.objects.filter(
+                        bouquet_id=OuterRef("pk"), flower_id__in=flowers
+                    )
+                )
+            )
+
+        price = Q()
+        if (price_min := params.get("price_min")) is not None:
+            price &= Q(price__gte=price_min)
+        if (price_max := params.get("price_max")) is not None:
+            price &= Q(price__lte=price_max)
+        if price:
+            filters["price"] = price
+
+        if (is_available := params.get("is_available")) is not None:
+            filters["is_available"] = Q(is_available=is_available)
+
+        return filters
+
+    def filter_queryset(self, request, queryset, view):
+        for condition in self.get_filters(request).values():
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def get_facets(self, request, queryset: QuerySet) -> dict[str, list[dict]]:
+        """
+        Count bouquets per category, per flower and per price band with a single
+        UNION ALL query.
+        """
+        filters = self.get_filters(request)
+        queryset = queryset.order_by()
+
+        def facet_queryset(facet: str, value, label, condition=Q()) -> QuerySet:
+            facet_qs = queryset.filter(condition)
+            for name, facet_condition in filters.items():
+                if name != facet:
+                    facet_qs = facet_qs.filter(facet_condition)
+            return (
+                facet_qs.values(
+                    facet=Value(facet, output_field=CharField()),
+                    value=Cast(value, output_field=CharField()),
+                    label=label,
+                )
+                .annotate(count=Count("pk", distinct=True))
+                .values_list("facet", "value", "label", "count")
+            )
+
+        price_band = Case(
+            *[
+                When(self._price_band_q(lower, upper), then=Value(band))
+                for band, lower, upper in PRICE_BANDS
+            ],
+            output_field=CharField(),
+        )
+        rows = facet_queryset(
+            "category",
+            "categories__id",
+            F("categories__name"),
+            Q(categories__isnull=False),
+        ).union(
+            facet_queryset(
+                "flower", "flowers__id", F("flowers__name"), Q(flowers__isnull=False)
+            ),
+            facet_queryset("price", price_band, price_band),
+            all=True,
+        )
+
+        facets: dict[str, list[dict]] = {"category": [], "flower": [], "price": []}
+        for facet, value, label, count in rows:
+            if facet != "price":
+                # Backends differ in how they cast uuids to text
+                value = str(UUID(value))
+            facets[facet].append({"value": value, "label": label, "count": count})
+
+        band_order = [band for band, _, _ in PRICE_BANDS]
+        facets["price"].sort(key=lambda item: band_order.index(item["value"]))
+        for facet in ["category", "flower"]:
+            facets[facet].sort(key=lambda item: (-item["count"], item["label"]))
+        return facets
+
+    @staticmethod
+    def _price_band_q(lower: Decimal | None, upper: Decimal | None) -> Q:
+        condition = Q()
+        if lower is not None:
+            condition &= Q(price__gte=lower)
+        if upper is not None:
+            condition &= Q(price__lt=upper)
+        return condition
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": name,
+                "required": False,
+                "in": "query",
+                "schema": schema,
+            }
+            for name, schema in [
+                (
+                    "category",
+                    {"type": "array", "items": {"type": "string", "format": "uuid"}},
+                ),
+                (
+                    "flower",
+                    {"type": "array", "items": {"type": "string", "format": "uuid"}},
+                ),
+                ("price_min", {"type": "number"}),
+                ("price_max", {"type": "number"}),
+                ("is_available", {"type": "boolean"}),
+            ]
+        ]
@@ -0,0 +1,141 @@
+import logging
+import shutil
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, models
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = "derivatives"
+# Maximum width of each derivative, images are never upscaled
+DERIVATIVE_WIDTHS = {
+    "thumbnail": 160,
+    "card": 480,
+    "full": 1200,
+}
+DERIVATIVE_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+
+def get_derivatives_dir(name: str) -> Path:
+    return Path(DERIVATIVES_DIR) / Path(name).with_suffix("")
+
+
+def render_derivatives(media_root: str, name: str) -> dict[str, Any]:
+    """
+    Render every derivative of the media file `name`. Runs inside the process
+    pool, so it only touches the filesystem and never the database.
+    """
+    target_dir = get_derivatives_dir(name)
+    (Path(media_root) / target_dir).mkdir(parents=True, exist_ok=True)
+
+    sizes: dict[str, dict[str, Any]] = {}
+    with Image.open(Path(media_root) / name) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ("RGB", "RGBA"):
+            source = source.convert("RGBA" if "A" in source.getbands() else "RGB")
+
+        for size, max_width in DERIVATIVE_WIDTHS.items():
+            image = source
+            if source.width > max_width:
+                height = round(source.height * max_width / source.width)
+                image = source.resize((max_width, height), Image.Resampling.LANCZOS)
+
+            sizes[size] = {"width": image.width, "height": image.height}
+            for extension, options in DERIVATIVE_FORMATS.items():
+                output = image
+                if options["format"] == "JPEG" and image.mode == "RGBA":
+                    # JPEG has no alpha channel, flatten on white
+                    output = Image.new("RGB", image.size, (255, 255, 255))
+                    output.paste(image, mask=image.getchannel("A"))
+
+                derivative_name = str(target_dir / f"{size}.{extension}")
+                output.save(Path(media_root) / derivative_name, **options)
+                sizes[size][extension] = derivative_name
+
+    return {"source": name, "sizes": sizes}
+
+
+def delete_derivatives(name: str) -> None:
+    shutil.rmtree(
+        Path(settings.MEDIA_ROOT) / get_derivatives_dir(name), ignore_errors=True
+    )
+
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # "spawn" so that workers do not inherit the database connections
+            # and threads of the gunicorn worker
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                mp_context=get_context("spawn"),
+            )
+        return _executor
+
+
+def save_derivatives(
+    model: type[models.Model], pk: Any, derivatives: dict[str, Any]
+) -> bool:
+    """
+    Store the rendered derivatives, unless the image was replaced in the
+    meantime, in which case they belong to nobody and are removed.
+    """
+    from flowers.cache import bump_catalog_version
+
+    updated = model._default_manager.filter(pk=pk, image=derivatives["source"]).update(
+        image_derivatives=derivatives
+    )
+    if not updated:
+        delete_derivatives(derivatives["source"])
+        return False
+
+    bump_catalog_version()
+    return True
+
+
+def generate_derivatives(instance: models.Model) -> Future:
+    """Render the derivatives of `instance.image` off the request thread."""
+    model, pk = instance.__class__, instance.pk
+
+    def on_done(future: Future) -> None:
+        try:
+            save_derivatives(model, pk, future.result())
+        except Exception:
+            logger.exception(
+                "Could not generate image derivatives for %s %s", model, pk
+            )
+        finally:
+            # Runs in the executor's bookkeeping thread, which would otherwise
+            # keep its own database connection open forever
+            connections.close_all()
+
+    future = get_executor().submit(
+        render_derivatives, str(settings.MEDIA_ROOT), instance.image.name  # type: ignore
+    )
+    future.add_done_callback(on_done)
+    return future
+
+
+def get_srcset(derivatives: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    srcset = {}
+    for size, variants in derivatives.get("sizes", {}).items():
+        srcset[size] = {
+            key: default_storage.url(value) if key in DERIVATIVE_FORMATS else value
+            for key, value in variants.items()
+        }
+    return srcset
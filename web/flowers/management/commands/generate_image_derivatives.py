@@ -0,0 +1,66 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from flowers.images import render_derivatives, save_derivatives
+from flowers.models import Bouquet, Flower
+
+
+class Command(BaseCommand):
+    help = (
+        "Render missing resized image derivatives of flowers and bouquets in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.IMAGE_DERIVATIVE_WORKERS,
+            help="Number of worker processes.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Render derivatives again even if they are up to date.",
+        )
+
+    def handle(self, *args, workers: int, force: bool, **options):
+        jobs = []
+        for model in [Flower, Bouquet]:
+            for pk, image, derivatives in (
+                model.objects.exclude(image="")
+                .values_list("pk", "image", "image_derivatives")
+                .iterator()
+            ):
+                if force or derivatives.get("source") != image:
+                    jobs.append((model, pk, image))
+
+        self.stdout.write(f"Rendering derivatives of {len(jobs)} images")
+
+        done = failed = 0
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn")
+        ) as executor:
+            futures = {
+                executor.submit(render_derivatives, str(settings.MEDIA_ROOT), image): (
+                    model,
+                    pk,
+                    image,
+                )
+                for model, pk, image in jobs
+            }
+            for future in as_completed(futures):
+                model, pk, image = futures[future]
+                try:
+                    save_derivatives(model, pk, future.result())
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{image}: {e}")
+                else:
+                    done += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rendered {done} images, {failed} failed")
+        )
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flowers', '0003_alter_bouquetflower_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bouquet',
+            index=models.Index(fields=['-created_at', '-id'], name='bouquet_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flower',
+            index=models.Index(fields=['-created_at', '-id'], name='flower_created_at_id_idx'),
+        ),
+    ]
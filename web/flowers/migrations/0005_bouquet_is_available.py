@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+def backfill_is_available(apps, schema_editor):
+    Bouquet = apps.get_model("flowers", "Bouquet")
+    BouquetFlower = apps.get_model("flowers", "BouquetFlower")
+
+    missing_flowers = BouquetFlower.objects.filter(
+        bouquet_id=models.OuterRef("pk"), flower__in_stock=False
+    )
+    Bouquet.objects.update(is_available=~models.Exists(missing_flowers))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flowers', '0004_bouquet_bouquet_created_at_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bouquet',
+            name='is_available',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='bouquet',
+            index=models.Index(fields=['is_available', '-created_at', '-id'], name='bouquet_available_created_idx'),
+        ),
+        migrations.RunPython(backfill_is_available, migrations.RunPython.noop),
+    ]
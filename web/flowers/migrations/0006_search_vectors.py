@@ -0,0 +1,81 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:43
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+SEARCH_CONFIGS = {"pl": "simple", "en": "english"}
+
+SEARCH_INDEXES = [
+    ("flowers_flower_search_pl_gin", "flowers_flower", "search_vector_pl"),
+    ("flowers_flower_search_en_gin", "flowers_flower", "search_vector_en"),
+    ("flowers_bouquet_search_pl_gin", "flowers_bouquet", "search_vector_pl"),
+    ("flowers_bouquet_search_en_gin", "flowers_bouquet", "search_vector_en"),
+    ("flowers_flower_name_trgm", "flowers_flower", "name gin_trgm_ops"),
+    ("flowers_bouquet_name_trgm", "flowers_bouquet", "name gin_trgm_ops"),
+    ("flowers_category_name_trgm", "flowers_bouquetcategory", "name gin_trgm_ops"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN indexes only exist on Postgres, other backends search in-process
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for name, table, expression in SEARCH_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({expression})"
+        )
+
+    for model_name in ["Flower", "Bouquet"]:
+        model = apps.get_model("flowers", model_name)
+        model.objects.update(
+            **{
+                f"search_vector_{language}": (
+                    SearchVector("name", weight="A", config=config)
+                    + SearchVector("description", weight="B", config=config)
+                )
+                for language, config in SEARCH_CONFIGS.items()
+            }
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for name, _, _ in SEARCH_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flowers', '0005_bouquet_is_available'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='bouquet',
+            name='search_vector_en',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='bouquet',
+            name='search_vector_pl',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='flower',
+            name='search_vector_en',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='flower',
+            name='search_vector_pl',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flowers', '0006_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bouquet',
+            index=models.Index(fields=['price'], name='bouquet_price_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:20
+
+from django.db import migrations, models
+from django.db.models import Exists, F, OuterRef
+
+# Stock given to flowers that were marked in stock, until the real inventory
+# is entered: as much as a single order line can take
+BACKFILL_STOCK = 10_000
+
+
+def backfill_stock(apps, schema_editor):
+    Flower = apps.get_model("flowers", "Flower")
+    Bouquet = apps.get_model("flowers", "Bouquet")
+    BouquetFlower = apps.get_model("flowers", "BouquetFlower")
+
+    Flower.objects.filter(in_stock=True).update(stock=BACKFILL_STOCK)
+    Bouquet.objects.update(
+        is_available=~Exists(
+            BouquetFlower.objects.filter(
+                bouquet_id=OuterRef("pk"), flower__stock__lt=F("quantity")
+            )
+        )
+    )
+
+
+def backfill_in_stock(apps, schema_editor):
+    Flower = apps.get_model("flowers", "Flower")
+    Flower.objects.filter(stock=0).update(in_stock=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flowers', '0008_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flower',
+            name='stock',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_stock, backfill_in_stock),
+        migrations.RemoveField(
+            model_name='flower',
+            name='in_stock',
+        ),
+    ]
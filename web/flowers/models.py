@@ -1,7 +1,9 @@
 from pathlib import Path
 from uuid import uuid4
 
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
@@ -18,6 +20,39 @@ def get_flower_img_path(instance: "Flower", filename: str) -> str:
     return str(Path("flowers") / new_filename)
 
 
+class FlowerQuerySet(models.QuerySet):
+    def with_details(self) -> "FlowerQuerySet":
+        return self.prefetch_related("bouquets")
+
+
+class BouquetCategoryQuerySet(models.QuerySet):
+    def with_bouquet_count(self) -> "BouquetCategoryQuerySet":
+        # Correlated subquery rather than `Count("bouquets")`: when used inside a
+        # `Prefetch("categories")` the prefetch filter reuses the join and the
+        # count would be limited to the prefetched bouquet
+        through = Bouquet.categories.through
+        bouquet_count = (
+            through.objects.filter(bouquetcategory_id=models.OuterRef("pk"))
+            .values("bouquetcategory_id")
+            .annotate(count=models.Count("*"))
+            .values("count")
+        )
+        return self.annotate(
+            bouquet_count=Coalesce(models.Subquery(bouquet_count), 0)
+        )
+
+
+class BouquetQuerySet(models.QuerySet):
+    def with_details(self) -> "BouquetQuerySet":
+        return self.prefetch_related(
+            "flowers__bouquets",
+            models.Prefetch(
+                "categories",
+                queryset=BouquetCategory.objects.with_bouquet_count(),
+            ),
+        )
+
+
 class BaseProduct(models.Model):
     id = models.UUIDField(
         primary_key=True, default=uuid4, editable=False, db_index=True
@@ -26,6 +61,11 @@ class BaseProduct(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained by `flowers.search.update_search_vectors`, one per `LANGUAGES`
+    search_vector_pl = SearchVectorField(null=True, editable=False)
+    search_vector_en = SearchVectorField(null=True, editable=False)
+    # Rendered by `flowers.images.generate_derivatives` after the image is saved
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     MAX_ORDER_QUANTITY: int
 
@@ -35,19 +75,44 @@ class BaseProduct(models.Model):
 
 class Flower(BaseProduct):
     image = models.ImageField(upload_to=get_flower_img_path)
-    in_stock = models.BooleanField(default=True)
+    # Units that can still be sold, reservations of unpaid orders are already
+    # taken out, see `orders.stock`
+    stock = models.PositiveIntegerField(default=0)
     can_be_sold_separately = models.BooleanField()
 
     MAX_ORDER_QUANTITY = 10_000
 
+    objects = FlowerQuerySet.as_manager()
+
     class Meta:  # type: ignore
         verbose_name = _("Flower")
         verbose_name_plural = _("Flowers")
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"], name="flower_created_at_id_idx"
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored stock, so that saves only refresh bouquet
+        # availability when it actually changes
+        instance._loaded_stock = instance.__dict__.get("stock")
+        return instance
+
+    @property
+    def in_stock(self) -> bool:
+        return self.stock > 0
+
+    @property
+    def stock_changed(self) -> bool:
+        return getattr(self, "_loaded_stock", None) != self.stock
+
 
 class BouquetCategory(models.Model):
     id = models.UUIDField(
@@ -55,6 +120,8 @@ class BouquetCategory(models.Model):
     )
     name = models.CharField(max_length=60, unique=True)
 
+    objects = BouquetCategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Category")
         verbose_name_plural = _("Categories")
@@ -69,6 +136,8 @@ class BouquetCategory(models.Model):
 
 class Bouquet(BaseProduct):
     image = models.ImageField(upload_to=get_bouquet_img_path)
+    # Maintained by `flowers.services.refresh_bouquet_availability`
+    is_available = models.BooleanField(default=True, editable=False)
     categories = models.ManyToManyField(BouquetCategory, related_name="bouquets")
     flowers = models.ManyToManyField(
         Flower, through="BouquetFlower", related_name="bouquets"
@@ -76,10 +145,22 @@ class Bouquet(BaseProduct):
 
     MAX_ORDER_QUANTITY = 50
 
+    objects = BouquetQuerySet.as_manager()
+
     class Meta:  # type: ignore
         verbose_name = _("Bouquet")
         verbose_name_plural = _("Bouquets")
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"], name="bouquet_created_at_id_idx"
+            ),
+            models.Index(
+                fields=["is_available", "-created_at", "-id"],
+                name="bouquet_available_created_idx",
+            ),
+            models.Index(fields=["price"], name="bouquet_price_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name}"
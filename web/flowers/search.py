@@ -0,0 +1,210 @@
+import math
+import re
+from collections import defaultdict
+from typing import Any, Iterable, Sequence
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection, models
+from django.db.models import Case, F, FloatField, Q, QuerySet, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils.translation import get_language
+
+from flowers.cache import get_catalog_version
+
+# Field weights in the order of `search_fields`, same defaults as ts_rank {A, B, C, D}
+SEARCH_WEIGHTS = {"A": 1.0, "B": 0.4, "C": 0.2, "D": 0.1}
+# Default `pg_trgm.similarity_threshold`
+TRIGRAM_SIMILARITY_THRESHOLD = 0.3
+
+_WORD_RE = re.compile(r"\w+")
+_ZETA_2 = math.pi**2 / 6
+
+
+def get_search_language() -> str:
+    language = (get_language() or settings.LANGUAGE_CODE).split("-")[0]
+    if language not in settings.SEARCH_CONFIGS:
+        return settings.LANGUAGE_CODE
+    return language
+
+
+def get_search_vector_field(language: str) -> str:
+    return f"search_vector_{language}"
+
+
+def build_search_vector(config: str, fields: Sequence[str]) -> SearchVector:
+    vector = None
+    for weight, field in zip(SEARCH_WEIGHTS, fields):
+        field_vector = SearchVector(field, weight=weight, config=config)
+        vector = field_vector if vector is None else vector + field_vector
+    return vector  # type: ignore
+
+
+def update_search_vectors(
+    model: type[models.Model], pks: Iterable[Any], fields: Sequence[str]
+) -> int:
+    """
+    Refresh the stored per-language `search_vector_<language>` columns. Only
+    Postgres keeps them, other backends use the in-process `SearchIndex`.
+    """
+    if connection.vendor != "postgresql":
+        return 0
+
+    return model._default_manager.filter(pk__in=pks).update(
+        **{
+            get_search_vector_field(language): build_search_vector(config, fields)
+            for language, config in settings.SEARCH_CONFIGS.items()
+        }
+    )
+
+
+def search_queryset(queryset: QuerySet, q: str, fields: Sequence[str]) -> QuerySet:
+    """
+    Filter `queryset` down to the rows matching `q` and annotate them with a
+    `search_rank` float: full-text rank over `fields` plus trigram similarity of
+    `name`, so that misspelled queries still find their product.
+    """
+    if connection.vendor == "postgresql":
+        return _search_postgres(queryset, q, fields)
+    return _search_in_process(queryset, q, fields)
+
+
+def _search_postgres(queryset: QuerySet, q: str, fields: Sequence[str]) -> QuerySet:
+    language = get_search_language()
+    config = settings.SEARCH_CONFIGS[language]
+    query = SearchQuery(q, config=config, search_type="websearch")
+
+    vector_field = get_search_vector_field(language)
+    try:
+        queryset.model._meta.get_field(vector_field)
+    except FieldDoesNotExist:
+        # Small tables without a stored vector, compute it on the fly
+        vector_field = "_search_vector"
+        queryset = queryset.annotate(
+            **{vector_field: build_search_vector(config, fields)}
+        )
+
+    # Rows saved without signals, e.g. by `bulk_create`, have no stored vector
+    # yet and only match by trigrams, a NULL rank would break the cursor
+    text_rank = Coalesce(SearchRank(F(vector_field), query), Value(0.0))
+    rank = text_rank + TrigramSimilarity("name", q)
+    return queryset.annotate(search_rank=Cast(rank, FloatField())).filter(
+        Q(**{vector_field: query}) | Q(name__trigram_similar=q)
+    )
+
+
+def _search_in_process(queryset: QuerySet, q: str, fields: Sequence[str]) -> QuerySet:
+    ranks = get_search_index(queryset.model, fields).search(q)
+    if not ranks:
+        return queryset.annotate(search_rank=Value(0.0)).none()
+
+    return queryset.filter(pk__in=ranks.keys()).annotate(
+        search_rank=Case(
+            *[When(pk=pk, then=Value(rank)) for pk, rank in ranks.items()],
+            output_field=FloatField(),
+        )
+    )
+
+
+def tokenize(text: str) -> list[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def trigrams(text: str) -> set[str]:
+    """Trigrams of every word, padded the way pg_trgm does it."""
+    result = set()
+    for word in tokenize(text):
+        padded = f"  {word} "
+        result.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def trigram_similarity(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+class SearchIndex:
+    """
+    In-process inverted index used when the database has no full-text search.
+
+    Ranking follows `ts_rank` (field weights, diminishing returns for repeated
+    occurrences of a term, averaged over the query terms) plus pg_trgm
+    similarity of the name, so results come back in the same order as on
+    Postgres with the "simple" configuration.
+    """
+
+    def __init__(self, rows: Iterable[Sequence[Any]]):
+        self.postings: dict[str, dict[Any, list[float]]] = defaultdict(dict)
+        self.trigram_postings: dict[str, set[Any]] = defaultdict(set)
+        self.name_trigrams: dict[Any, set[str]] = {}
+
+        for pk, *values in rows:
+            for weight, value in zip(SEARCH_WEIGHTS.values(), values):
+                for token in tokenize(value or ""):
+                    self.postings[token].setdefault(pk, []).append(weight)
+
+            self.name_trigrams[pk] = trigrams(values[0] or "")
+            for trigram in self.name_trigrams[pk]:
+                self.trigram_postings[trigram].add(pk)
+
+    def search(self, q: str) -> dict[Any, float]:
+        ranks: dict[Any, float] = {}
+
+        terms = tokenize(q)
+        if terms:
+            matches = set.intersection(
+                *(set(self.postings.get(term, ())) for term in terms)
+            )
+            for pk in matches:
+                ranks[pk] = sum(
+                    self._term_rank(self.postings[term][pk]) for term in terms
+                ) / len(terms)
+
+        query_trigrams = trigrams(q)
+        candidates = set()
+        for trigram in query_trigrams:
+            candidates |= self.trigram_postings.get(trigram, set())
+
+        for pk in candidates:
+            similarity = trigram_similarity(query_trigrams, self.name_trigrams[pk])
+            if pk in ranks:
+                ranks[pk] += similarity
+            elif similarity >= TRIGRAM_SIMILARITY_THRESHOLD:
+                ranks[pk] = similarity
+
+        return ranks
+
+    @staticmethod
+    def _term_rank(weights: list[float]) -> float:
+        weights = sorted(weights, reverse=True)
+        return sum(w / (i + 1) ** 2 for i, w in enumerate(weights)) / _ZETA_2
+
+
+_search_indexes: dict[tuple[str, tuple[str, ...]], tuple[int, SearchIndex]] = {}
+
+
+def get_search_index(model: type[models.Model], fields: Sequence[str]) -> SearchIndex:
+    key = (model._meta.label, tuple(fields))
+    version = get_catalog_version()
+
+    cached = _search_indexes.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    index = SearchIndex(model._default_manager.values_list("pk", *fields).iterator())
+    _search_indexes[key] = (version, index)
+    return index
+
+
+def invalidate_search_index(model: type[models.Model]) -> None:
+    for key in [key for key in _search_indexes if key[0] == model._meta.label]:
+        _search_indexes.pop(key, None)
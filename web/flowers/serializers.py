@@ -1,9 +1,30 @@
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
+from flowers.images import get_srcset
 from flowers.models import Bouquet, BouquetCategory, Flower
 
 
+class ImageSrcsetField(serializers.ReadOnlyField):
+    """Absolute URLs of the resized image derivatives, grouped by size."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("source", "image_derivatives")
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        srcset = get_srcset(value or {})
+        if (request := self.context.get("request")) is not None:
+            for variants in srcset.values():
+                for key, url in variants.items():
+                    if isinstance(url, str):
+                        variants[key] = request.build_absolute_uri(url)
+        return srcset
+
+
 class FlowerSerializer(serializers.ModelSerializer):
+    srcset = ImageSrcsetField()
+
     class Meta:
         model = Flower
         fields = [
@@ -13,6 +34,7 @@ class FlowerSerializer(serializers.ModelSerializer):
             "description",
             "created_at",
             "image",
+            "srcset",
             "in_stock",
             "can_be_sold_separately",
             "bouquets",
@@ -28,13 +50,18 @@ class BouquetSerializer(serializers.ModelSerializer):
             fields = ["id", "name", "bouquet_count"]
 
         def get_bouquet_count(self, obj: BouquetCategory) -> int:
-            return obj.bouquets.count()
+            # Annotated by `BouquetCategoryQuerySet.with_bouquet_count`
+            bouquet_count = getattr(obj, "bouquet_count", None)
+            if bouquet_count is None:
+                return obj.bouquets.count()
+            return bouquet_count
 
     categories = BouquetCategoryInlineSerializer(
         many=True,
         read_only=True,
     )
     flowers = FlowerSerializer(many=True, read_only=True)
+    srcset = ImageSrcsetField()
 
     class Meta:
         model = Bouquet
@@ -45,6 +72,8 @@ class BouquetSerializer(serializers.ModelSerializer):
             "description",
             "created_at",
             "image",
+            "srcset",
+            "is_available",
             "categories",
             "flowers",
         ]
@@ -59,3 +88,25 @@ class BouquetCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = BouquetCategory
         fields = ["id", "name", "bouquets"]
+
+
+class BouquetFilterSerializer(serializers.Serializer):
+    category = serializers.ListField(child=serializers.UUIDField(), required=False)
+    flower = serializers.ListField(child=serializers.UUIDField(), required=False)
+    price_min = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False
+    )
+    price_max = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False
+    )
+    is_available = serializers.BooleanField(
+        required=False, allow_null=True, default=None
+    )
+
+    def validate(self, attrs):
+        price_min, price_max = attrs.get("price_min"), attrs.get("price_max")
+        if price_min is not None and price_max is not None and price_min > price_max:
+            raise serializers.ValidationError(
+                {"price_max": _("Must be greater than or equal to price_min.")}
+            )
+        return attrs
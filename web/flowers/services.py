@@ -0,0 +1,32 @@
+from typing import Iterable
+from uuid import UUID
+
+from django.db.models import Exists, F, OuterRef, QuerySet
+
+from flowers.models import Bouquet, BouquetFlower
+
+
+def refresh_bouquet_availability(bouquet_ids: Iterable[UUID] | QuerySet) -> int:
+    """
+    Recompute `Bouquet.is_available` for the given bouquets with a single
+    set-based UPDATE: a bouquet is available while every flower has at least
+    `BouquetFlower.quantity` units in stock. Accepts either a list of ids or a
+    `values("bouquet_id")` style queryset, which is then inlined as a subquery.
+    Only rows whose availability flips are written, their count is returned.
+    """
+    missing_flowers = BouquetFlower.objects.filter(
+        bouquet_id=OuterRef("pk"), flower__stock__lt=F("quantity")
+    )
+    is_available = ~Exists(missing_flowers)
+    return (
+        Bouquet.objects.filter(pk__in=bouquet_ids)
+        .alias(available=is_available)
+        .exclude(is_available=F("available"))
+        .update(is_available=is_available)
+    )
+
+
+def refresh_flower_bouquets_availability(flower_ids: Iterable[UUID]) -> int:
+    return refresh_bouquet_availability(
+        BouquetFlower.objects.filter(flower_id__in=flower_ids).values("bouquet_id")
+    )
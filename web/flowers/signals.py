@@ -0,0 +1,108 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from flowers.cache import bump_catalog_version
+from flowers.images import delete_derivatives, generate_derivatives
+from flowers.models import Bouquet, BouquetCategory, BouquetFlower, Flower
+from flowers.search import invalidate_search_index, update_search_vectors
+from flowers.services import (
+    refresh_bouquet_availability,
+    refresh_flower_bouquets_availability,
+)
+
+
+@receiver(post_save, sender=Flower)
+@receiver(post_save, sender=Bouquet)
+@receiver(post_save, sender=BouquetFlower)
+@receiver(post_save, sender=BouquetCategory)
+@receiver(post_delete, sender=Flower)
+@receiver(post_delete, sender=Bouquet)
+@receiver(post_delete, sender=BouquetFlower)
+@receiver(post_delete, sender=BouquetCategory)
+def invalidate_catalog_on_change(sender, **kwargs) -> None:
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(m2m_changed, sender=Bouquet.categories.through)
+@receiver(m2m_changed, sender=Bouquet.flowers.through)
+def invalidate_catalog_on_m2m_change(sender, action: str, **kwargs) -> None:
+    if action in ("post_add", "post_remove", "post_clear"):
+        transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Flower)
+def refresh_availability_on_stock_change(
+    sender, instance: Flower, created: bool, **kwargs
+) -> None:
+    if not created and instance.stock_changed:
+        refresh_flower_bouquets_availability([instance.pk])
+    instance._loaded_stock = instance.stock
+
+
+@receiver(post_save, sender=BouquetFlower)
+@receiver(post_delete, sender=BouquetFlower)
+def refresh_availability_on_bouquet_flower_change(
+    sender, instance: BouquetFlower, **kwargs
+) -> None:
+    refresh_bouquet_availability([instance.bouquet_id])
+
+
+@receiver(m2m_changed, sender=Bouquet.flowers.through)
+def refresh_availability_on_flowers_change(
+    sender, instance: Bouquet | Flower, action: str, reverse: bool, pk_set, **kwargs
+) -> None:
+    if reverse:
+        # `flower.bouquets.<action>()`, pk_set holds bouquet ids
+        if action == "pre_clear":
+            instance._cleared_bouquet_ids = list(
+                BouquetFlower.objects.filter(flower=instance).values_list(
+                    "bouquet_id", flat=True
+                )
+            )
+        elif action in ("post_add", "post_remove"):
+            refresh_bouquet_availability(pk_set)
+        elif action == "post_clear":
+            refresh_bouquet_availability(getattr(instance, "_cleared_bouquet_ids", []))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        refresh_bouquet_availability([instance.pk])
+
+
+@receiver(post_save, sender=Flower)
+@receiver(post_save, sender=Bouquet)
+def refresh_search_vectors(
+    sender, instance: Flower | Bouquet, update_fields, **kwargs
+) -> None:
+    fields = ["name", "description"]
+    if update_fields is None or set(update_fields) & set(fields):
+        update_search_vectors(sender, [instance.pk], fields)
+
+
+@receiver(post_save, sender=Flower)
+@receiver(post_save, sender=Bouquet)
+@receiver(post_save, sender=BouquetCategory)
+@receiver(post_delete, sender=Flower)
+@receiver(post_delete, sender=Bouquet)
+@receiver(post_delete, sender=BouquetCategory)
+def invalidate_search_index_on_change(sender, **kwargs) -> None:
+    invalidate_search_index(sender)
+
+
+@receiver(post_save, sender=Flower)
+@receiver(post_save, sender=Bouquet)
+def generate_image_derivatives(sender, instance: Flower | Bouquet, **kwargs) -> None:
+    source = instance.image_derivatives.get("source")
+    if not instance.image or source == instance.image.name:
+        return
+
+    transaction.on_commit(lambda: generate_derivatives(instance))
+    if source:
+        # Derivatives of the replaced image
+        transaction.on_commit(lambda: delete_derivatives(source))
+
+
+@receiver(post_delete, sender=Flower)
+@receiver(post_delete, sender=Bouquet)
+def delete_image_derivatives(sender, instance: Flower | Bouquet, **kwargs) -> None:
+    if source := instance.image_derivatives.get("source"):
+        transaction.on_commit(lambda: delete_derivatives(source))
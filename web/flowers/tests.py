@@ -1,12 +1,30 @@
-from django.urls import reverse
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from pathlib import Path
+
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 
-from flowers.models import Flower, Bouquet, BouquetCategory
+from core.tests import ServedThroughASGIMixin
+from flowers.cache import get_catalog_cache_stats, get_catalog_version
+from flowers.images import render_derivatives, save_derivatives
+from flowers.models import Flower, Bouquet, BouquetCategory, BouquetFlower
+from flowers.views import AsyncFlowerListAPIView
+from users.models import User
 
 
 class FlowerAPITestCase(APITestCase):
     def setUp(self):
+        cache.clear()
         self.flower = Flower.objects.create(name="Rose", price=10, can_be_sold_separately=True)
         self.bouquet = Bouquet.objects.create(name="Bouquet1", price=50)
         self.bouquet.flowers.add(self.flower)
@@ -17,7 +35,7 @@ class FlowerAPITestCase(APITestCase):
         url = reverse("flowers:flower-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response.data) > 0)
+        self.assertTrue(len(response.data["results"]) > 0)
 
     def test_flower_detail(self):
         url = reverse("flowers:flower-detail", args=[self.flower.pk])
@@ -29,7 +47,7 @@ class FlowerAPITestCase(APITestCase):
         url = reverse("flowers:bouquet-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response.data) > 0)
+        self.assertTrue(len(response.data["results"]) > 0)
 
     def test_bouquet_detail(self):
         url = reverse("flowers:bouquet-detail", args=[self.bouquet.pk])
@@ -41,10 +59,460 @@ class FlowerAPITestCase(APITestCase):
         url = reverse("flowers:bouquet-category-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response.data) > 0)
+        self.assertTrue(len(response.data["results"]) > 0)
 
     def test_bouquet_category_detail(self):
         url = reverse("flowers:bouquet-category-detail", args=[self.category.pk])
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["id"], str(self.category.pk))
+
+    def test_flower_list_cursor_pagination(self):
+        Flower.objects.bulk_create(
+            Flower(name=f"Flower {i}", price=1, can_be_sold_separately=True)
+            for i in range(24)
+        )
+        url = reverse("flowers:flower-list")
+
+        seen = []
+        next_url = f"{url}?page_size=10"
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item["id"] for item in response.data["results"])
+            next_url = response.data["next"]
+
+        expected = [
+            str(pk)
+            for pk in Flower.objects.order_by("-created_at", "-id").values_list(
+                "pk", flat=True
+            )
+        ]
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(f"{url}?page_size=10")
+        response = self.client.get(response.data["next"])
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([item["id"] for item in response.data["results"]], expected[:10])
+        self.assertIsNone(response.data["previous"])
+
+    def test_flower_list_invalid_cursor(self):
+        url = reverse("flowers:flower-list")
+        response = self.client.get(f"{url}?cursor=invalid")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_flower_list_cursor_bounds_leading_field(self):
+        Flower.objects.bulk_create(
+            Flower(name=f"Flower {i}", price=1, can_be_sold_separately=True)
+            for i in range(3)
+        )
+        url = reverse("flowers:flower-list")
+        response = self.client.get(f"{url}?page_size=2")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(response.data["next"])
+
+        # Besides the expanded OR, the range start of the (created_at, id) index
+        page_sql = next(q["sql"] for q in queries if "flowers_flower" in q["sql"])
+        self.assertIn('"flowers_flower"."created_at" <= ', page_sql)
+
+    def _create_bouquets(self, count: int) -> None:
+        categories = [
+            BouquetCategory.objects.get_or_create(name=f"Category {i}")[0] for i in range(3)
+        ]
+        for i in range(count):
+            bouquet = Bouquet.objects.create(name=f"Bouquet {count}-{i}", price=20)
+            bouquet.flowers.add(self.flower)
+            bouquet.categories.add(*categories)
+
+    def _count_list_queries(self, url_name: str) -> int:
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(url_name), {"page_size": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_bouquet_list_query_count_is_constant(self):
+        self._create_bouquets(3)
+        small = self._count_list_queries("flowers:bouquet-list")
+        self._create_bouquets(10)
+        large = self._count_list_queries("flowers:bouquet-list")
+        self.assertEqual(small, large)
+
+    def test_bouquet_category_list_query_count_is_constant(self):
+        self._create_bouquets(3)
+        small = self._count_list_queries("flowers:bouquet-category-list")
+        self._create_bouquets(10)
+        large = self._count_list_queries("flowers:bouquet-category-list")
+        self.assertEqual(small, large)
+
+    def test_bouquet_category_count(self):
+        self._create_bouquets(4)
+        response = self.client.get(reverse("flowers:bouquet-list"))
+        bouquet = next(
+            item for item in response.data["results"] if item["name"] == "Bouquet 4-0"
+        )
+        self.assertEqual(
+            {category["bouquet_count"] for category in bouquet["categories"]}, {4}
+        )
+
+
+class BouquetAvailabilityTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.rose = Flower.objects.create(
+            name="Rose", price=10, can_be_sold_separately=True, stock=10
+        )
+        self.tulip = Flower.objects.create(
+            name="Tulip", price=5, can_be_sold_separately=True, stock=10
+        )
+        self.bouquet = Bouquet.objects.create(name="Bouquet1", price=50)
+        self.bouquet.flowers.add(self.rose, self.tulip)
+
+    def test_flower_stock_flip_updates_bouquet(self):
+        self.rose.stock = 0
+        self.rose.save()
+        self.bouquet.refresh_from_db()
+        self.assertFalse(self.bouquet.is_available)
+
+        self.rose.stock = 10
+        self.rose.save()
+        self.bouquet.refresh_from_db()
+        self.assertTrue(self.bouquet.is_available)
+
+    def test_bouquet_needs_flower_quantity_in_stock(self):
+        BouquetFlower.objects.filter(bouquet=self.bouquet, flower=self.rose).update(
+            quantity=12
+        )
+        self.rose.stock = 11
+        self.rose.save()
+        self.bouquet.refresh_from_db()
+        self.assertFalse(self.bouquet.is_available)
+
+        self.rose.stock = 12
+        self.rose.save()
+        self.bouquet.refresh_from_db()
+        self.assertTrue(self.bouquet.is_available)
+
+    def test_bouquet_flower_changes_update_bouquet(self):
+        lily = Flower.objects.create(
+            name="Lily", price=7, can_be_sold_separately=True, stock=0
+        )
+        self.bouquet.flowers.add(lily)
+        self.bouquet.refresh_from_db()
+        self.assertFalse(self.bouquet.is_available)
+
+        lily.bouquets.remove(self.bouquet)
+        self.bouquet.refresh_from_db()
+        self.assertTrue(self.bouquet.is_available)
+
+    def test_bouquet_list_filter_is_available(self):
+        self.tulip.stock = 0
+        self.tulip.save()
+        available = Bouquet.objects.create(name="Bouquet2", price=30)
+        available.flowers.add(self.rose)
+
+        url = reverse("flowers:bouquet-list")
+        response = self.client.get(url, {"is_available": "true"})
+        self.assertEqual(
+            [item["id"] for item in response.data["results"]], [str(available.pk)]
+        )
+        response = self.client.get(url, {"is_available": "false"})
+        self.assertEqual(
+            [item["id"] for item in response.data["results"]], [str(self.bouquet.pk)]
+        )
+        response = self.client.get(url, {"is_available": "maybe"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BouquetFacetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.rose = Flower.objects.create(name="Rose", price=10, can_be_sold_separately=True)
+        self.lily = Flower.objects.create(name="Lily", price=8, can_be_sold_separately=True)
+        self.love = BouquetCategory.objects.create(name="Love")
+        self.birthday = BouquetCategory.objects.create(name="Birthday")
+
+        self.cheap = Bouquet.objects.create(name="Cheap", price=30)
+        self.cheap.flowers.add(self.rose)
+        self.cheap.categories.add(self.love)
+        self.medium = Bouquet.objects.create(name="Medium", price=80)
+        self.medium.flowers.add(self.rose, self.lily)
+        self.medium.categories.add(self.love, self.birthday)
+        self.expensive = Bouquet.objects.create(name="Expensive", price=250)
+        self.expensive.flowers.add(self.lily)
+        self.expensive.categories.add(self.birthday)
+
+    def _names(self, **params) -> set[str]:
+        response = self.client.get(reverse("flowers:bouquet-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item["name"] for item in response.data["results"]}
+
+    def test_filter_by_category(self):
+        self.assertEqual(self._names(category=self.love.pk), {"Cheap", "Medium"})
+
+    def test_filter_by_flower_and_price(self):
+        self.assertEqual(
+            self._names(flower=[self.lily.pk], price_min=50, price_max=100), {"Medium"}
+        )
+
+    def test_filter_validation(self):
+        url = reverse("flowers:bouquet-list")
+        response = self.client.get(url, {"price_min": 100, "price_max": 50})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {"category": "not-a-uuid"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facets_single_query(self):
+        url = reverse("flowers:bouquet-facets")
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"category": self.love.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        counts = {
+            facet: {item["label"]: item["count"] for item in items}
+            for facet, items in response.data.items()
+        }
+        # The category facet ignores its own filter, the others respect it
+        self.assertEqual(counts["category"], {"Love": 2, "Birthday": 2})
+        self.assertEqual(counts["flower"], {"Rose": 2, "Lily": 1})
+        self.assertEqual(counts["price"], {"0-50": 1, "50-100": 1})
+        self.assertIn(
+            str(self.love.pk), [item["value"] for item in response.data["category"]]
+        )
+
+    def test_facets_cached_per_filter_combination(self):
+        url = reverse("flowers:bouquet-facets")
+        self.client.get(f"{url}?price_min=10&price_max=100")
+        response = self.client.get(f"{url}?price_max=100&price_min=10")
+        self.assertEqual(response["X-Cache"], "HIT")
+        response = self.client.get(f"{url}?price_max=200&price_min=10")
+        self.assertEqual(response["X-Cache"], "MISS")
+
+
+class CatalogSearchTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.rose = Flower.objects.create(
+            name="Red rose", price=10, can_be_sold_separately=True
+        )
+        self.tulip = Flower.objects.create(
+            name="Tulip",
+            price=5,
+            can_be_sold_separately=True,
+            description="Pairs well with a rose",
+        )
+        Flower.objects.create(name="Lily", price=7, can_be_sold_separately=True)
+
+    def _search(self, url_name: str, q: str, **params) -> list[str]:
+        response = self.client.get(reverse(url_name), {"q": q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["name"] for item in response.data["results"]]
+
+    def test_search_ranks_name_above_description(self):
+        self.assertEqual(self._search("flowers:flower-list", "rose"), ["Red rose", "Tulip"])
+
+    def test_search_tolerates_typos(self):
+        self.assertEqual(self._search("flowers:flower-list", "tulp"), ["Tulip"])
+
+    def test_search_without_matches(self):
+        self.assertEqual(self._search("flowers:flower-list", "orchid"), [])
+
+    def test_search_results_are_paginated(self):
+        Flower.objects.bulk_create(
+            Flower(name=f"Rose {i}", price=1, can_be_sold_separately=True)
+            for i in range(5)
+        )
+        url = reverse("flowers:flower-list")
+
+        names = []
+        next_url = f"{url}?q=rose&page_size=3"
+        while next_url:
+            response = self.client.get(next_url)
+            names.extend(item["name"] for item in response.data["results"])
+            next_url = response.data["next"]
+
+        self.assertEqual(len(names), 7)
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(names[-1], "Tulip")
+
+    def test_search_picks_up_changes(self):
+        self.tulip.name = "Tulipan"
+        self.tulip.save()
+        self.assertEqual(self._search("flowers:flower-list", "tulipan"), ["Tulipan"])
+
+    def test_category_search(self):
+        BouquetCategory.objects.create(name="Wedding")
+        BouquetCategory.objects.create(name="Birthday")
+        self.assertEqual(
+            self._search("flowers:bouquet-category-list", "weding"), ["Wedding"]
+        )
+
+
+class ImageDerivativesTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        buffer = BytesIO()
+        Image.new("RGBA", (1600, 800), (200, 30, 60, 128)).save(buffer, "PNG")
+        self.flower = Flower.objects.create(
+            name="Rose",
+            price=10,
+            can_be_sold_separately=True,
+            image=SimpleUploadedFile("rose.png", buffer.getvalue()),
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_render_derivatives(self):
+        derivatives = render_derivatives(self.media_root, self.flower.image.name)
+
+        self.assertEqual(derivatives["source"], self.flower.image.name)
+        thumbnail = derivatives["sizes"]["thumbnail"]
+        self.assertEqual((thumbnail["width"], thumbnail["height"]), (160, 80))
+        self.assertEqual(derivatives["sizes"]["full"]["width"], 1200)
+        for variants in derivatives["sizes"].values():
+            for extension in ["webp", "jpeg"]:
+                with Image.open(Path(self.media_root) / variants[extension]) as image:
+                    self.assertEqual(image.width, variants["width"])
+
+    def test_srcset_in_serializer(self):
+        derivatives = render_derivatives(self.media_root, self.flower.image.name)
+        self.assertTrue(save_derivatives(Flower, self.flower.pk, derivatives))
+
+        url = reverse("flowers:flower-detail", args=[self.flower.pk])
+        response = self.client.get(url)
+        card = response.data["srcset"]["card"]
+        self.assertEqual(card["width"], 480)
+        self.assertTrue(card["webp"].startswith("http://testserver/media/derivatives/"))
+        self.assertTrue(card["jpeg"].endswith("/card.jpeg"))
+
+    def test_stale_derivatives_are_discarded(self):
+        derivatives = render_derivatives(self.media_root, self.flower.image.name)
+        Flower.objects.filter(pk=self.flower.pk).update(image="flowers/other.png")
+
+        self.assertFalse(save_derivatives(Flower, self.flower.pk, derivatives))
+        self.assertFalse(
+            (Path(self.media_root) / derivatives["sizes"]["card"]["webp"]).exists()
+        )
+
+    def test_backfill_command(self):
+        call_command("generate_image_derivatives", workers=1, stdout=StringIO())
+        self.flower.refresh_from_db()
+        self.assertEqual(self.flower.image_derivatives["source"], self.flower.image.name)
+
+
+class CatalogCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.flower = Flower.objects.create(name="Rose", price=10, can_be_sold_separately=True)
+
+    def test_detail_served_from_cache(self):
+        url = reverse("flowers:flower-detail", args=[self.flower.pk])
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data["name"], "Rose")
+
+        stats = get_catalog_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_save_invalidates_cache(self):
+        url = reverse("flowers:flower-detail", args=[self.flower.pk])
+        self.client.get(url)
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flower.name = "Red rose"
+            self.flower.save()
+
+        self.assertEqual(get_catalog_version(), version + 1)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["name"], "Red rose")
+
+    def test_m2m_change_invalidates_cache(self):
+        bouquet = Bouquet.objects.create(name="Bouquet1", price=50)
+        category = BouquetCategory.objects.create(name="Love")
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bouquet.categories.add(category)
+
+        self.assertEqual(get_catalog_version(), version + 1)
+
+    def test_stats_require_admin(self):
+        url = reverse("flowers:catalog-cache-stats")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        admin = User.objects.create_superuser(
+            email="admin@mail.com",
+            password="1234",
+            first_name="Admin",
+            last_name="Admin",
+            phone="+48123456780",
+        )
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("hits", response.data)
+
+
+class AsyncCatalogTestCase(ServedThroughASGIMixin, APITestCase):
+    """The async catalog views, served on an event loop as under ASGI."""
+
+    def setUp(self):
+        cache.clear()
+        self.flower = Flower.objects.create(name="Rose", price=10, can_be_sold_separately=True)
+        self.bouquet = Bouquet.objects.create(name="Rose bouquet", price=50)
+        self.bouquet.flowers.add(self.flower)
+        self.category = BouquetCategory.objects.create(name="Love")
+        self.category.bouquets.add(self.bouquet)
+
+    async def test_lists(self):
+        for name in ["flower-list", "bouquet-list", "bouquet-category-list"]:
+            response = await self.async_client.get(reverse(f"flowers:{name}"))
+            self.assertEqual(response.status_code, status.HTTP_200_OK, name)
+            self.assertEqual(len(response.json()["results"]), 1, name)
+
+    async def test_detail_then_cache_hit(self):
+        url = reverse("flowers:bouquet-detail", args=[self.bouquet.pk])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["categories"][0]["bouquet_count"], 1)
+
+        response = await self.async_client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.json()["id"], str(self.bouquet.pk))
+
+    async def test_detail_not_found(self):
+        url = reverse("flowers:flower-detail", args=[self.category.pk])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_search_and_facets(self):
+        response = await self.async_client.get(
+            reverse("flowers:bouquet-list"), {"q": "rose"}
+        )
+        self.assertEqual(response.json()["results"][0]["id"], str(self.bouquet.pk))
+
+        response = await self.async_client.get(reverse("flowers:bouquet-facets"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_async_views_routed(self):
+        match = resolve(reverse("flowers:flower-list"))
+        self.assertIs(match.func.cls, AsyncFlowerListAPIView)
+
+    async def test_rate_limit_headers(self):
+        response = await self.async_client.get(reverse("flowers:flower-list"))
+        self.assertIn("RateLimit-Remaining", response)
@@ -1,26 +1,53 @@
 from django.urls import path
 
+from core.views import interface_view
 from flowers import views
 
 app_name = "flowers"
 
 urlpatterns = [
-    path("flowers/", views.FlowerListAPIView.as_view(), name="flower-list"),
+    path(
+        "flowers/",
+        interface_view(views.FlowerListAPIView, views.AsyncFlowerListAPIView),
+        name="flower-list",
+    ),
     path(
         "flowers/<uuid:pk>/",
-        views.FlowerDetailAPIView.as_view(),
+        interface_view(views.FlowerDetailAPIView, views.AsyncFlowerDetailAPIView),
         name="flower-detail",
     ),
-    path("bouquets/", views.BouquetListAPIView.as_view(), name="bouquet-list"),
+    path(
+        "bouquets/",
+        interface_view(views.BouquetListAPIView, views.AsyncBouquetListAPIView),
+        name="bouquet-list",
+    ),
+    path(
+        "bouquets/facets/",
+        interface_view(views.BouquetFacetsAPIView, views.AsyncBouquetFacetsAPIView),
+        name="bouquet-facets",
+    ),
     path(
         "bouquets/<uuid:pk>/",
-        views.BouquetDetailAPIView.as_view(),
+        interface_view(views.BouquetDetailAPIView, views.AsyncBouquetDetailAPIView),
         name="bouquet-detail",
     ),
-    path("categories/", views.BouquetCategoryListAPIView.as_view(), name="bouquet-category-list"),
+    path(
+        "categories/",
+        interface_view(
+            views.BouquetCategoryListAPIView, views.AsyncBouquetCategoryListAPIView
+        ),
+        name="bouquet-category-list",
+    ),
     path(
         "categories/<uuid:pk>/",
-        views.BouquetCategoryDetailAPIView.as_view(),
+        interface_view(
+            views.BouquetCategoryDetailAPIView, views.AsyncBouquetCategoryDetailAPIView
+        ),
         name="bouquet-category-detail",
     ),
+    path(
+        "catalog-cache/stats/",
+        views.CatalogCacheStatsAPIView.as_view(),
+        name="catalog-cache-stats",
+    ),
 ]
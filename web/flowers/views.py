@@ -1,5 +1,19 @@
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from rest_framework import status
 from rest_framework.generics import ListAPIView, RetrieveAPIView
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from core.pagination import KeysetCursorPagination, NameCursorPagination
+from core.views import AsyncListAPIView, AsyncRetrieveAPIView
+from flowers.cache import (
+    AsyncCatalogCacheMixin,
+    CatalogCacheMixin,
+    get_catalog_cache_stats,
+)
+from flowers.filters import BouquetFilter, CatalogSearchFilter
 from flowers.models import Flower, Bouquet, BouquetCategory
 from flowers.serializers import (
     BouquetSerializer,
@@ -8,31 +22,117 @@ from flowers.serializers import (
 )
 
 
-class FlowerListAPIView(ListAPIView):
-    queryset = Flower.objects.all()
+class FlowerListAPIView(CatalogCacheMixin, ListAPIView):
+    throttle_scope = "catalog"
+    queryset = Flower.objects.with_details()
     serializer_class = FlowerSerializer
+    pagination_class = KeysetCursorPagination
+    filter_backends = [CatalogSearchFilter]
+    search_fields = ["name", "description"]
 
 
-class FlowerDetailAPIView(RetrieveAPIView):
-    queryset = Flower.objects.all()
+class FlowerDetailAPIView(CatalogCacheMixin, RetrieveAPIView):
+    throttle_scope = "catalog"
+    queryset = Flower.objects.with_details()
     serializer_class = FlowerSerializer
 
 
-class BouquetListAPIView(ListAPIView):
-    queryset = Bouquet.objects.prefetch_related("flowers").all()
+class BouquetListAPIView(CatalogCacheMixin, ListAPIView):
+    throttle_scope = "catalog"
+    queryset = Bouquet.objects.with_details()
     serializer_class = BouquetSerializer
+    pagination_class = KeysetCursorPagination
+    filter_backends = [CatalogSearchFilter, BouquetFilter]
+    search_fields = ["name", "description"]
+
+
+class BouquetFacetsAPIView(CatalogCacheMixin, ListAPIView):
+    throttle_scope = "catalog"
+    queryset = Bouquet.objects.all()
+    filter_backends = [CatalogSearchFilter]
+    search_fields = ["name", "description"]
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        facets = BouquetFilter().get_facets(request, queryset)
+        return Response(facets, status=status.HTTP_200_OK)
 
-class BouquetDetailAPIView(RetrieveAPIView):
-    queryset = Bouquet.objects.prefetch_related("flowers").all()
+
+class BouquetDetailAPIView(CatalogCacheMixin, RetrieveAPIView):
+    throttle_scope = "catalog"
+    queryset = Bouquet.objects.with_details()
     serializer_class = BouquetSerializer
 
 
-class BouquetCategoryListAPIView(ListAPIView):
-    queryset = BouquetCategory.objects.prefetch_related("bouquets").all()
+class BouquetCategoryListAPIView(CatalogCacheMixin, ListAPIView):
+    throttle_scope = "catalog"
+    queryset = BouquetCategory.objects.prefetch_related(
+        Prefetch("bouquets", queryset=Bouquet.objects.with_details())
+    )
     serializer_class = BouquetCategorySerializer
+    pagination_class = NameCursorPagination
+    filter_backends = [CatalogSearchFilter]
+    search_fields = ["name"]
 
 
-class BouquetCategoryDetailAPIView(RetrieveAPIView):
-    queryset = BouquetCategory.objects.prefetch_related("bouquets").all()
+class BouquetCategoryDetailAPIView(CatalogCacheMixin, RetrieveAPIView):
+    throttle_scope = "catalog"
+    queryset = BouquetCategory.objects.prefetch_related(
+        Prefetch("bouquets", queryset=Bouquet.objects.with_details())
+    )
     serializer_class = BouquetCategorySerializer
+
+
+# Served instead under ASGI, see `core.views.interface_view`
+
+
+class AsyncFlowerListAPIView(
+    AsyncCatalogCacheMixin, AsyncListAPIView, FlowerListAPIView
+):
+    pass
+
+
+class AsyncFlowerDetailAPIView(
+    AsyncCatalogCacheMixin, AsyncRetrieveAPIView, FlowerDetailAPIView
+):
+    pass
+
+
+class AsyncBouquetListAPIView(
+    AsyncCatalogCacheMixin, AsyncListAPIView, BouquetListAPIView
+):
+    pass
+
+
+class AsyncBouquetFacetsAPIView(
+    AsyncCatalogCacheMixin, AsyncListAPIView, BouquetFacetsAPIView
+):
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        facets = await sync_to_async(BouquetFilter().get_facets)(request, queryset)
+        return Response(facets, status=status.HTTP_200_OK)
+
+
+class AsyncBouquetDetailAPIView(
+    AsyncCatalogCacheMixin, AsyncRetrieveAPIView, BouquetDetailAPIView
+):
+    pass
+
+
+class AsyncBouquetCategoryListAPIView(
+    AsyncCatalogCacheMixin, AsyncListAPIView, BouquetCategoryListAPIView
+):
+    pass
+
+
+class AsyncBouquetCategoryDetailAPIView(
+    AsyncCatalogCacheMixin, AsyncRetrieveAPIView, BouquetCategoryDetailAPIView
+):
+    pass
+
+
+class CatalogCacheStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_catalog_cache_stats(), status=status.HTTP_200_OK)
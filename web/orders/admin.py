@@ -1,11 +1,58 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils.text import format_lazy
+from django.utils.translation import gettext_lazy as _
 
-from orders.models import Order, OrderItem
+from orders.models import Order, OrderItem, OrderStatusTransition
+from orders.transitions import transition_orders
+
+
+class OrderStatusTransitionInline(admin.TabularInline):
+    model = OrderStatusTransition
+    fields = ["from_status", "to_status", "changed_by", "created_at"]
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+def status_action(from_status: Order.Status, to_status: Order.Status):
+    def action(modeladmin, request, queryset):
+        moved = transition_orders(queryset, from_status, to_status, request.user)
+        modeladmin.message_user(
+            request,
+            _("%(count)s of %(selected)s orders marked as %(status)s")
+            % {
+                "count": len(moved),
+                "selected": queryset.count(),
+                "status": to_status.label,
+            },
+            messages.SUCCESS if moved else messages.WARNING,
+        )
+
+    action.__name__ = f"mark_{to_status.value}"
+    # Lazy, the labels are translated to the language of each admin request
+    action.short_description = format_lazy(
+        _("Mark {from_status} orders as {to_status}"),
+        from_status=from_status.label,
+        to_status=to_status.label,
+    )
+    return action
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    pass
+    list_display = ["id", "user", "status", "total", "created_at"]
+    list_filter = ["status"]
+    # Status only changes through the transition actions
+    readonly_fields = ["status"]
+    inlines = [OrderStatusTransitionInline]
+    actions = [
+        status_action(Order.Status.PAID, Order.Status.PREPARING),
+        status_action(Order.Status.PREPARING, Order.Status.IN_DELIVERY),
+        status_action(Order.Status.IN_DELIVERY, Order.Status.DELIVERED),
+    ]
 
 
 @admin.register(OrderItem)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from orders.services import merge_duplicate_carts
+
+
+class Command(BaseCommand):
+    help = "Merge the open carts of users who have more than one into a single cart."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of users merged per transaction.",
+        )
+
+    def handle(self, *args, batch_size: int, **options):
+        users, deleted, cancelled = merge_duplicate_carts(batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Merged the carts of {users} users, "
+                f"deleted {deleted} and cancelled {cancelled} carts"
+            )
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from orders.services import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than IDEMPOTENCY_KEY_TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of keys deleted per query.",
+        )
+
+    def handle(self, *args, batch_size: int, **options):
+        deleted = purge_idempotency_keys(batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys")
+        )
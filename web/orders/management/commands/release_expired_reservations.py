@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from orders.stock import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Put stock reserved for orders whose payment expired back on sale."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of orders released per transaction.",
+        )
+
+    def handle(self, *args, batch_size: int, **options):
+        orders, reservations = release_expired_reservations(batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Released {reservations} reservations of {orders} orders"
+            )
+        )
@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.services import sweep_abandoned_carts
+
+
+class Command(BaseCommand):
+    help = "Delete, or cancel when they have payments, open carts nobody touched for a while."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=settings.ABANDONED_CART_AGE,
+            help="Age in seconds since the last change of a cart.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of carts swept per transaction.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches, to spread the load.",
+        )
+
+    def handle(self, *args, older_than: int, batch_size: int, pause: float, **options):
+        started = time.monotonic()
+        deleted, cancelled = sweep_abandoned_carts(
+            timedelta(seconds=older_than), batch_size, pause
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} and cancelled {cancelled} abandoned carts "
+                f"in {elapsed:.1f}s ({(deleted + cancelled) / max(elapsed, 1e-6):.0f} carts/s)"
+            )
+        )
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:12
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def iterate_pk_batches(queryset):
+    """Primary keys of `queryset` in ordered batches, each one its own UPDATE."""
+    last_pk = None
+    while True:
+        batch = queryset.order_by("pk")
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        pks = list(batch.values_list("pk", flat=True)[:BATCH_SIZE])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def backfill_prices(apps, schema_editor):
+    Flower = apps.get_model("flowers", "Flower")
+    Bouquet = apps.get_model("flowers", "Bouquet")
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+
+    # Existing items are priced at the current product price, the best
+    # snapshot still available
+    product_price = Coalesce(
+        Subquery(Flower.objects.filter(pk=OuterRef("flower_id")).values("price")[:1]),
+        Subquery(Bouquet.objects.filter(pk=OuterRef("bouquet_id")).values("price")[:1]),
+        models.Value(Decimal("0.00")),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    for pks in iterate_pk_batches(OrderItem.objects.filter(unit_price__isnull=True)):
+        OrderItem.objects.filter(pk__in=pks).update(unit_price=product_price)
+
+    items_total = (
+        OrderItem.objects.filter(order_id=OuterRef("pk"))
+        .values("order_id")
+        .annotate(
+            total=Sum(
+                ExpressionWrapper(
+                    F("quantity") * F("unit_price"),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                )
+            )
+        )
+        .values("total")
+    )
+    for pks in iterate_pk_batches(Order.objects.all()):
+        Order.objects.filter(pk__in=pks).update(
+            total=Coalesce(
+                Subquery(items_total),
+                models.Value(Decimal("0.00")),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+
+class Migration(migrations.Migration):
+    # Every batch commits on its own, so large tables are not locked for the
+    # whole backfill
+    atomic = False
+
+    dependencies = [
+        ('flowers', '0008_image_derivatives'),
+        ('orders', '0006_order_order_user_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:05
+
+from django.db import migrations, models, transaction
+from django.db.models import Count, Sum
+
+BATCH_SIZE = 500
+
+
+def consolidate_duplicate_items(apps, schema_editor):
+    """
+    Merge every group of lines with the same order and product into its first
+    line. The kept line's unit price applies to the merged quantity, so order
+    totals are recomputed. Each batch of groups is committed on its own.
+    """
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+
+    for product_field in ["flower", "bouquet"]:
+        duplicates = (
+            OrderItem.objects.filter(**{f"{product_field}__isnull": False})
+            .values("order_id", f"{product_field}_id")
+            .annotate(count=Count("pk"), quantity=Sum("quantity"))
+            .filter(count__gt=1)
+            .order_by("order_id", f"{product_field}_id")
+        )
+
+        while groups := list(duplicates[:BATCH_SIZE]):
+            with transaction.atomic(using=schema_editor.connection.alias):
+                order_ids = set()
+                for group in groups:
+                    lines = OrderItem.objects.filter(
+                        order_id=group["order_id"],
+                        **{f"{product_field}_id": group[f"{product_field}_id"]},
+                    )
+                    keep = lines.order_by("pk").values_list("pk", flat=True)[0]
+                    lines.filter(pk=keep).update(quantity=group["quantity"])
+                    lines.exclude(pk=keep).delete()
+                    order_ids.add(group["order_id"])
+
+                for order in Order.objects.filter(pk__in=order_ids):
+                    order.total = sum(
+                        (item.quantity * item.unit_price for item in order.items.all()),
+                        start=0,
+                    )
+                    order.save(update_fields=["total"])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('flowers', '0008_image_derivatives'),
+        ('orders', '0007_order_total_orderitem_unit_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(consolidate_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(fields=('order', 'flower'), name='unique_order_flower'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(fields=('order', 'bouquet'), name='unique_order_bouquet'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flowers', '0009_flower_stock'),
+        ('orders', '0010_payment_provider_reference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('flower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='flowers.flower')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Stock Reservation',
+                'verbose_name_plural': 'Stock Reservations',
+                'constraints': [models.UniqueConstraint(fields=('order', 'flower'), name='unique_order_flower_reservation')],
+            },
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:11
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+BATCH_SIZE = 500
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """
+    Merge the open carts of every user with more than one into the newest one,
+    after failing their pending payments, like the `merge_duplicate_carts`
+    command. Each batch of users is committed on its own.
+    """
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    Payment = apps.get_model("orders", "Payment")
+    StockReservation = apps.get_model("orders", "StockReservation")
+
+    duplicated_users = (
+        Order.objects.filter(status="waiting_payment", user__isnull=False)
+        .values("user_id")
+        .annotate(carts=Count("pk"))
+        .filter(carts__gt=1)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+    )
+
+    while user_ids := list(duplicated_users[:BATCH_SIZE]):
+        with transaction.atomic(using=schema_editor.connection.alias):
+            for user_id in user_ids:
+                carts = list(
+                    Order.objects.select_for_update()
+                    .filter(user_id=user_id, status="waiting_payment")
+                    .order_by("-created_at")
+                )
+                # Items of a cart being paid can not change. Its reservations
+                # are expired right away, `release_expired_reservations` then
+                # puts the stock back
+                pending_payments = list(
+                    Payment.objects.select_for_update()
+                    .filter(order__in=carts, status="pending")
+                    .values_list("pk", "order_id")
+                )
+                Payment.objects.filter(
+                    pk__in=[pk for pk, _ in pending_payments]
+                ).update(status="failed")
+                StockReservation.objects.filter(
+                    order_id__in=[order_id for _, order_id in pending_payments]
+                ).update(expires_at=timezone.now())
+
+                cart, *duplicates = carts
+                duplicate_ids = [order.pk for order in duplicates]
+
+                lines = {
+                    (item.flower_id, item.bouquet_id): item
+                    for item in OrderItem.objects.filter(order=cart)
+                }
+                duplicate_items = OrderItem.objects.filter(order_id__in=duplicate_ids)
+                for item in duplicate_items.order_by("pk"):
+                    key = (item.flower_id, item.bouquet_id)
+                    if key in lines:
+                        lines[key].quantity += item.quantity
+                    else:
+                        item.order = cart
+                        lines[key] = item
+                duplicate_items.exclude(
+                    pk__in=[item.pk for item in lines.values()]
+                ).delete()
+                OrderItem.objects.bulk_update(lines.values(), ["order", "quantity"])
+
+                cart.total = sum(
+                    (item.quantity * item.unit_price for item in lines.values()),
+                    start=0,
+                )
+                cart.save(update_fields=["total"])
+
+                Order.objects.filter(pk__in=duplicate_ids).filter(
+                    Exists(Payment.objects.filter(order_id=OuterRef("pk")))
+                ).update(status="cancelled", total=0)
+                Order.objects.filter(
+                    pk__in=duplicate_ids, status="waiting_payment"
+                ).delete()
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('orders', '0011_stockreservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'waiting_payment')), fields=('user',), name='unique_open_cart_per_user'),
+        ),
+    ]
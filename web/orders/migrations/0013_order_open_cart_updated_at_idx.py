@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_unique_open_cart_per_user'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'waiting_payment')), fields=['updated_at'], name='order_open_cart_updated_at_idx'),
+        ),
+    ]
@@ -4,11 +4,34 @@ from uuid import uuid4
 
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, RegexValidator
 from django.utils.translation import gettext_lazy as _
 
 from users.models import User
-from flowers.models import Bouquet, Flower
+from flowers.models import Bouquet, BouquetCategory, Flower
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_details(self) -> "OrderQuerySet":
+        return self.prefetch_related(
+            models.Prefetch("items", queryset=OrderItem.objects.with_details()),
+            "payments",
+        )
+
+
+class OrderItemQuerySet(models.QuerySet):
+    def with_details(self) -> "OrderItemQuerySet":
+        # Everything `OrderItemDetailSerializer.get_product` renders, so the
+        # number of queries does not depend on the number of items
+        return self.select_related("flower", "bouquet").prefetch_related(
+            "flower__bouquets",
+            "bouquet__flowers__bouquets",
+            models.Prefetch(
+                "bouquet__categories",
+                queryset=BouquetCategory.objects.with_bouquet_count(),
+            ),
+        )
 
 
 class Order(models.Model):
@@ -48,26 +71,59 @@ class Order(models.Model):
     postal_code = models.CharField(
         max_length=6, blank=True, null=True, validators=[postal_code_validator]
     )
+    # Sum of the item prices, maintained by `orders.services` with F() updates
+    total = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00"), editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     from django.db.models import QuerySet
     items: QuerySet["Order"]
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Order")
         verbose_name_plural = _("Order")
         ordering = ["-created_at", "-updated_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="order_user_created_at_id_idx"
+            ),
+            # Only open carts, for `sweep_abandoned_carts`
+            models.Index(
+                fields=["updated_at"],
+                condition=models.Q(status="waiting_payment"),
+                name="order_open_cart_updated_at_idx",
+            ),
+            # Fulfillment queues, small and index-only however long the
+            # order history grows
+            models.Index(
+                fields=["created_at", "id"],
+                condition=models.Q(status="paid"),
+                name="order_paid_created_at_idx",
+            ),
+            models.Index(
+                fields=["created_at", "id"],
+                condition=models.Q(status="in_delivery"),
+                name="order_in_delivery_created_idx",
+            ),
+        ]
+        constraints = [
+            # The open cart, `OrderListAPIView.create` looks it up through this index
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=models.Q(status="waiting_payment"),
+                name="unique_open_cart_per_user",
+            ),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - {self.status}"
 
     @property
     def total_price(self) -> Decimal:
-        total = Decimal(0)
-        for item in self.items.all():
-            total += item.price
-
-        return total
+        return self.total
 
 
 class OrderItem(models.Model):
@@ -92,6 +148,12 @@ class OrderItem(models.Model):
         null=True,
     )
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    # Product price when the item was added, set on first save
+    unit_price = models.DecimalField(
+        max_digits=10, decimal_places=2, blank=True, editable=False
+    )
+
+    objects = OrderItemQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("Order Item")
@@ -100,7 +162,14 @@ class OrderItem(models.Model):
             models.CheckConstraint(
                 check=(models.Q(flower__isnull=True) | models.Q(bouquet__isnull=True)),
                 name="no_both_flower_and_bouquet",
-            )
+            ),
+            # One line per product, `services.create_order_item` upserts on these
+            models.UniqueConstraint(
+                fields=["order", "flower"], name="unique_order_flower"
+            ),
+            models.UniqueConstraint(
+                fields=["order", "bouquet"], name="unique_order_bouquet"
+            ),
         ]
         ordering = ["order"]
 
@@ -119,22 +188,27 @@ class OrderItem(models.Model):
         if self.flower is not None:
             return self.flower.in_stock
         if self.bouquet is not None:
-            return not self.bouquet.flowers.filter(in_stock=False).exists()
+            return self.bouquet.is_available
 
         return False
 
     @property
     def price(self) -> Decimal:
-        if self.product is None:
+        if self.unit_price is None:
             return Decimal(0)
 
-        return self.product.price * self.quantity
+        return self.unit_price * self.quantity
 
     def __str__(self) -> str:
         if self.product is not None:
             return f"{self.quantity} × {self.product}"
         return _("unknown")
 
+    def save(self, *args, **kwargs) -> None:
+        if self.unit_price is None and self.product is not None:
+            self.unit_price = self.product.price
+        super().save(*args, **kwargs)
+
     def clean(self) -> None:
         super().clean()
 
@@ -163,6 +237,40 @@ class OrderItem(models.Model):
             )
 
 
+class OrderStatusTransition(models.Model):
+    """
+    Append-only log of order status changes, written by
+    `orders.transitions.transition_orders` in the same transaction.
+    """
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="status_transitions"
+    )
+    from_status = models.CharField(max_length=20, choices=Order.Status)
+    to_status = models.CharField(max_length=20, choices=Order.Status)
+    changed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name="order_status_transitions",
+        blank=True,
+        null=True,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Order Status Transition")
+        verbose_name_plural = _("Order Status Transitions")
+        ordering = ["created_at", "id"]
+
+    def __str__(self) -> str:
+        return f"{self.order_id}: {self.from_status} → {self.to_status}"
+
+    def save(self, *args, **kwargs) -> None:
+        if not self._state.adding:
+            raise ValueError("Order status transitions can not be changed")
+        super().save(*args, **kwargs)
+
+
 class Payment(models.Model):
     class Method(models.TextChoices):
         BLIK = "blik", "BLIK"
@@ -180,5 +288,63 @@ class Payment(models.Model):
         choices=Status,
         default=Status.PENDING.value,
     )
+    # Charge id at the payment provider, set once the provider accepted it
+    provider_reference = models.CharField(
+        max_length=100, blank=True, null=True, unique=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(blank=True, null=True)
+
+
+class StockReservation(models.Model):
+    """Flower units taken out of `Flower.stock` for an order that is being paid."""
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="stock_reservations"
+    )
+    flower = models.ForeignKey(
+        Flower, on_delete=models.CASCADE, related_name="stock_reservations"
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = _("Stock Reservation")
+        verbose_name_plural = _("Stock Reservations")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order", "flower"], name="unique_order_flower_reservation"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.quantity} × {self.flower_id} for {self.order_id}"
+
+
+class IdempotencyKey(models.Model):
+    """Result of a request sent with an `Idempotency-Key` header, replayed on retries."""
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid4, editable=False, db_index=True
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="idempotency_keys"
+    )
+    key = models.CharField(max_length=255)
+    # Hash of the method, path and body the key was first used with
+    request_fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_data = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = _("Idempotency Key")
+        verbose_name_plural = _("Idempotency Keys")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="unique_user_idempotency_key"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return self.key
@@ -0,0 +1,156 @@
+import hashlib
+import hmac
+import json
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from functools import lru_cache
+from threading import Lock, Timer
+from typing import Any
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentProviderError(Exception):
+    """Transient provider failure (timeout, 5xx, ...), the charge is retried."""
+
+
+@dataclass
+class Charge:
+    payment_id: int
+    amount: Decimal
+    method: str
+
+
+class PaymentProvider:
+    """
+    Gateway a payment is sent to. `create_charge` starts the charge and returns
+    the provider's reference, the outcome arrives later through the webhook.
+    `payment_id` must be used as the provider-side idempotency key, so that a
+    retried charge is never taken twice. Implementations must give up after
+    `timeout` seconds and raise `PaymentProviderError`.
+    """
+
+    def create_charge(self, charge: Charge, timeout: float) -> str:
+        raise NotImplementedError
+
+
+class LocalGatewayProvider(PaymentProvider):
+    """
+    In-process stand-in for a real gateway, for development and tests. It
+    settles every charge with `LOCAL_GATEWAY_OUTCOME` ("completed", "failed",
+    or "error" to simulate an unreachable gateway) and delivers a signed
+    webhook event to `handle_webhook` after `LOCAL_GATEWAY_DELAY` seconds.
+    """
+
+    def __init__(self) -> None:
+        self.references: dict[int, str] = {}
+        self.lock = Lock()
+
+    def create_charge(self, charge: Charge, timeout: float) -> str:
+        outcome = settings.LOCAL_GATEWAY_OUTCOME
+        if outcome == "error":
+            raise PaymentProviderError("Local gateway is unavailable")
+
+        with self.lock:
+            if charge.payment_id in self.references:
+                return self.references[charge.payment_id]
+            reference = self.references[charge.payment_id] = f"local_{uuid4().hex}"
+
+        body = json.dumps(
+            {"payment": charge.payment_id, "reference": reference, "status": outcome}
+        ).encode()
+        if settings.PAYMENT_PROVIDER_EAGER:
+            deliver_webhook(body)
+        else:
+            Timer(settings.LOCAL_GATEWAY_DELAY, deliver_webhook, [body]).start()
+        return reference
+
+
+def deliver_webhook(body: bytes) -> None:
+    from orders.services import handle_webhook
+
+    try:
+        handle_webhook(body, sign_webhook(body))
+    finally:
+        if not settings.PAYMENT_PROVIDER_EAGER:
+            connections.close_all()
+
+
+def sign_webhook(body: bytes) -> str:
+    return hmac.new(
+        settings.PAYMENT_WEBHOOK_SECRET.encode(), body, hashlib.sha256
+    ).hexdigest()
+
+
+def verify_webhook(body: bytes, signature: str) -> bool:
+    return hmac.compare_digest(sign_webhook(body), signature)
+
+
+@lru_cache(maxsize=None)
+def get_provider() -> PaymentProvider:
+    return import_string(settings.PAYMENT_PROVIDER)()
+
+
+_executor: ThreadPoolExecutor | None = None
+_lock = Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Provider calls wait on the network, threads are enough and keep
+            # them off the request workers
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PAYMENT_PROVIDER_WORKERS,
+                thread_name_prefix="payments",
+            )
+        return _executor
+
+
+def send_charge(charge: Charge) -> str | None:
+    """
+    Call the provider, retrying transient failures with exponential backoff.
+    Returns the provider reference, or None when every attempt failed.
+    """
+    provider = get_provider()
+    for attempt in range(settings.PAYMENT_PROVIDER_RETRIES + 1):
+        if attempt:
+            time.sleep(settings.PAYMENT_PROVIDER_BACKOFF * 2 ** (attempt - 1))
+        try:
+            return provider.create_charge(charge, settings.PAYMENT_PROVIDER_TIMEOUT)
+        except PaymentProviderError:
+            logger.warning(
+                "Charge of payment %s failed, attempt %s",
+                charge.payment_id,
+                attempt + 1,
+                exc_info=True,
+            )
+    return None
+
+
+def submit_charge(charge: Charge) -> Future | None:
+    """Send `charge` off the request thread, or inline with `PAYMENT_PROVIDER_EAGER`."""
+    from orders.services import record_charge
+
+    if settings.PAYMENT_PROVIDER_EAGER:
+        record_charge(charge.payment_id, send_charge(charge))
+        return None
+
+    def run() -> Any:
+        try:
+            record_charge(charge.payment_id, send_charge(charge))
+        except Exception:
+            logger.exception("Could not charge payment %s", charge.payment_id)
+        finally:
+            connections.close_all()
+
+    return get_executor().submit(run)
@@ -1,4 +1,5 @@
 from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
 from orders import services
@@ -38,7 +39,9 @@ class BaseOrderItemSerializer(serializers.ModelSerializer):
             "bouquet",
             "product",
             "quantity",
+            "unit_price",
         ]
+        read_only_fields = ["unit_price"]
 
     def get_product(self, obj):
         if obj.flower is not None:
@@ -51,7 +54,7 @@ class BaseOrderItemSerializer(serializers.ModelSerializer):
 
 class OrderItemListSerializer(BaseOrderItemSerializer):
     class Meta(BaseOrderItemSerializer.Meta):
-        read_only_fields = ["order"]
+        read_only_fields = ["order", "unit_price"]
 
     def to_internal_value(self, data):
         attrs = super().to_internal_value(data)
@@ -67,7 +70,9 @@ class OrderItemListSerializer(BaseOrderItemSerializer):
         obj = OrderItem(**attrs)
 
         try:
-            obj.full_clean()
+            # Adding a product already in the order merges into its line, so
+            # the unique constraints are not a validation error here
+            obj.full_clean(validate_constraints=False)
         except ValidationError as e:
             raise serializers.ValidationError(e.message_dict)
 
@@ -86,6 +91,7 @@ class OrderItemDetailSerializer(BaseOrderItemSerializer):
             "flower",
             "bouquet",
             "product",
+            "unit_price",
         ]
 
     def validate(self, attrs):
@@ -101,13 +107,28 @@ class OrderItemDetailSerializer(BaseOrderItemSerializer):
         return attrs
 
     def update(self, instance: OrderItem, validated_data):
-        if instance.order.status not in [
-            Order.Status.WAITING_PAYMENT,
-            Order.Status.PAID,
-            Order.Status.PREPARING,
-        ]:
-            return
-        return super().update(instance, validated_data)
+        return services.update_order_item(instance, **validated_data)
+
+
+class OrderItemOperationSerializer(serializers.Serializer):
+    flower = serializers.UUIDField(required=False, allow_null=True)
+    bouquet = serializers.UUIDField(required=False, allow_null=True)
+    quantity = serializers.IntegerField(min_value=1)
+
+    def validate(self, attrs):
+        if bool(attrs.get("flower")) == bool(attrs.get("bouquet")):
+            raise serializers.ValidationError(
+                _("Select exactly one of flower or bouquet")
+            )
+        return attrs
+
+
+class OrderItemBulkSerializer(serializers.Serializer):
+    MAX_OPERATIONS = 100
+
+    items = OrderItemOperationSerializer(
+        many=True, allow_empty=False, max_length=MAX_OPERATIONS
+    )
 
 
 class OrderSerializer(serializers.ModelSerializer):
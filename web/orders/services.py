@@ -1,65 +1,533 @@
-from typing import Any
+import json
+import logging
+import time
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Callable
 
-from django.db import transaction
-from django.db.models import Q
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import PermissionDenied, ValidationError
 
-from orders.models import Order, OrderItem, Payment
+from flowers.models import Bouquet, Flower
+from orders.models import IdempotencyKey, Order, OrderItem, Payment
+from orders.payments import Charge, submit_charge, verify_webhook
+from orders.stock import commit_reservations, release_reservations, reserve_stock
+from orders.transitions import transition_orders
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+
+def add_to_order_total(order_id: Any, amount: Decimal) -> None:
+    # `update()` skips `auto_now`, the cart is touched explicitly so that
+    # `sweep_abandoned_carts` sees the activity
+    if amount:
+        Order.objects.filter(pk=order_id).update(
+            total=F("total") + amount, updated_at=timezone.now()
+        )
+
+
+def lock_order_for_items(order_id: Any) -> Order:
+    """
+    Lock the order row for a change of its items, refused while a payment is
+    pending and once the order is paid: the charge and the reserved stock are
+    those of the items when `/pay/` was called.
+    """
+    order = Order.objects.select_for_update().get(pk=order_id)
+    if order.status != Order.Status.WAITING_PAYMENT:
+        raise ValidationError(
+            {"detail": _("Items of this order can no longer be changed")}
+        )
+    if order.payments.filter(status=Payment.Status.PENDING).exists():
+        raise ValidationError(
+            {"detail": _("Items can not be changed while a payment is in progress")}
+        )
+    return order
+
+
+UPSERT_ORDER_ITEM_SQL = """
+    INSERT INTO {table} ({id}, {order}, {flower}, {bouquet}, {quantity}, {unit_price})
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT ({order}, {product}) DO UPDATE
+    SET {quantity} = {table}.{quantity} + EXCLUDED.{quantity}
+    WHERE {table}.{quantity} + EXCLUDED.{quantity} <= %s
+    RETURNING {id}, {quantity}, {unit_price}
+"""
+
+
+def _upsert_order_item(item: OrderItem) -> OrderItem | None:
+    """
+    Insert `item`, or add its quantity to the existing line of the same product,
+    in a single statement so that concurrent requests cannot create duplicates.
+    Returns the stored line, or None when the merged quantity would exceed
+    `MAX_ORDER_QUANTITY`.
+    """
+    opts = OrderItem._meta
+    quote_name = connection.ops.quote_name
+    fields = [
+        opts.get_field(name)
+        for name in ["id", "order", "flower", "bouquet", "quantity", "unit_price"]
+    ]
+    columns = {field.name: quote_name(field.column) for field in fields}
+    product_field = "flower" if item.flower_id is not None else "bouquet"
+    sql = UPSERT_ORDER_ITEM_SQL.format(
+        table=quote_name(opts.db_table), product=columns[product_field], **columns
+    )
+    params = [
+        field.get_db_prep_save(getattr(item, field.attname), connection)
+        for field in fields
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, item.product.MAX_ORDER_QUANTITY])  # type: ignore
+        row = cursor.fetchone()
+    if row is None:
+        return None
+
+    pk, quantity, unit_price = row
+    stored = OrderItem(
+        id=opts.pk.to_python(pk),
+        order=item.order,
+        flower=item.flower,
+        bouquet=item.bouquet,
+        quantity=quantity,
+        unit_price=opts.get_field("unit_price").to_python(unit_price),
+    )
+    stored._state.adding = False
+    return stored
 
 
 @transaction.atomic
 def create_order_item(**validated_data: dict[str, Any]) -> OrderItem:
     new_item_obj = OrderItem(**validated_data)
+    # Serializes with `bulk_add_order_items`, which inserts new lines without
+    # an upsert
+    lock_order_for_items(new_item_obj.order_id)
     if not new_item_obj.in_stock:
         raise ValidationError({"detail": _("Currently product is not in stock")})
 
-    same_product_items_qs = OrderItem.objects.filter(order=new_item_obj.order).filter(
-        Q(bouquet=new_item_obj.bouquet) | Q(flower=new_item_obj.flower)
+    new_item_obj.unit_price = new_item_obj.product.price  # type: ignore
+    item_obj = _upsert_order_item(new_item_obj)
+    if item_obj is None:
+        raise ValidationError(
+            {
+                "quantity": _(
+                    f"Maximum quantity for this product is {new_item_obj.product.MAX_ORDER_QUANTITY}."  # type: ignore
+                )
+            }
+        )
+
+    # A merged line keeps its original unit price
+    add_to_order_total(item_obj.order_id, item_obj.unit_price * new_item_obj.quantity)
+    return item_obj
+
+
+@transaction.atomic
+def bulk_add_order_items(
+    order: Order, operations: list[dict[str, Any]]
+) -> list[OrderItem]:
+    """
+    Add every `{flower|bouquet, quantity}` operation to `order`, merging them
+    into the existing items like `create_order_item` does. Products and items
+    are loaded with one query each and written with `bulk_create`/`bulk_update`.
+    Nothing is applied unless every line is valid, errors are reported per line.
+    """
+    order = lock_order_for_items(order.pk)
+    flowers = Flower.objects.in_bulk(
+        {operation["flower"] for operation in operations if operation.get("flower")}
+    )
+    bouquets = Bouquet.objects.in_bulk(
+        {operation["bouquet"] for operation in operations if operation.get("bouquet")}
     )
+    items = {
+        (item.flower_id, item.bouquet_id): item
+        for item in OrderItem.objects.select_for_update().filter(order=order)
+    }
 
-    if same_product_items_qs.exists():
-        item_obj = same_product_items_qs[0]
-        for tmp_item_obj in same_product_items_qs[1:]:
-            item_obj.quantity += tmp_item_obj.quantity
+    changed_items: dict[tuple[Any, Any], OrderItem] = {}
+    errors: list[dict[str, Any]] = []
+    total_delta = Decimal(0)
+    for operation in operations:
+        flower = flowers.get(operation.get("flower"))
+        bouquet = bouquets.get(operation.get("bouquet"))
+        if flower is None and bouquet is None:
+            field = "flower" if operation.get("flower") else "bouquet"
+            errors.append({field: [_("Product does not exist")]})
+            continue
 
-        item_obj.quantity += new_item_obj.quantity
-        same_product_items_qs.exclude(pk=item_obj.pk).delete()
-    else:
-        item_obj = new_item_obj
+        key = (getattr(flower, "pk", None), getattr(bouquet, "pk", None))
+        item = items.get(key)
+        if item is None:
+            item = OrderItem(
+                order=order,
+                flower=flower,
+                bouquet=bouquet,
+                quantity=0,
+                unit_price=(flower or bouquet).price,
+            )
+        candidate = OrderItem(
+            order=order,
+            flower=flower,
+            bouquet=bouquet,
+            quantity=item.quantity + operation["quantity"],
+        )
 
-    item_obj.save()
-    return item_obj
+        try:
+            candidate.clean()
+        except DjangoValidationError as e:
+            errors.append(e.message_dict)
+            continue
+        if not candidate.in_stock:
+            errors.append({"detail": [_("Currently product is not in stock")]})
+            continue
+
+        errors.append({})
+        item.quantity = candidate.quantity
+        items[key] = changed_items[key] = item
+        total_delta += item.unit_price * operation["quantity"]
+
+    if any(errors):
+        raise ValidationError({"items": errors})
+
+    # No other request can insert a line while the order row is locked, every
+    # writer of new lines takes that lock first
+    new_items = [item for item in changed_items.values() if item._state.adding]
+    updated_items = [item for item in changed_items.values() if not item._state.adding]
+    OrderItem.objects.bulk_create(new_items)
+    OrderItem.objects.bulk_update(updated_items, ["quantity"])
+    add_to_order_total(order.pk, total_delta)
+    return list(changed_items.values())
+
+
+@transaction.atomic
+def update_order_item(item: OrderItem, **validated_data: Any) -> OrderItem:
+    lock_order_for_items(item.order_id)
+    previous_price = OrderItem.objects.select_for_update().get(pk=item.pk).price
+
+    for field, value in validated_data.items():
+        setattr(item, field, value)
+    item.save()
+
+    add_to_order_total(item.order_id, item.price - previous_price)
+    return item
+
+
+@transaction.atomic
+def delete_order_item(item: OrderItem) -> None:
+    lock_order_for_items(item.order_id)
+    add_to_order_total(item.order_id, -item.price)
+    item.delete()
 
 
 @transaction.atomic
 def complete_order_payment(
     order: Order, payment_method: Payment.Method
 ) -> Payment:
+    """
+    Start paying for `order`: create a PENDING payment and send the charge to
+    the provider once committed. The webhook finalizes the payment and order.
+    """
+    # Serializes concurrent payments of the same order, the second one sees
+    # the status or the pending payment of the first
+    order = Order.objects.select_for_update().get(pk=order.pk)
     if order.status != Order.Status.WAITING_PAYMENT:
         raise ValidationError(
             {"detail": _("Order is already paid or cannot be paid")}
         )
-    if not order.items.exists():
+    if order.payments.filter(status=Payment.Status.PENDING).exists():
         raise ValidationError(
-            {"detail": _("Cannot pay for empty order")}
+            {"detail": _("Payment for this order is already in progress")}
         )
-    if order.items.filter(
-        Q(flower__in_stock=False) | Q(bouquet__flowers__in_stock=False)
-    ).exists():
+    if not order.items.exists():
         raise ValidationError(
-            {"detail": _("Currently one of the order products is not in stock")}
+            {"detail": _("Cannot pay for empty order")}
         )
+    # Held until the payment completes, fails or expires
+    reserve_stock(order)
 
     payment = Payment.objects.create(
         order=order,
         method=payment_method,
-        status=Payment.Status.COMPLETED,
-        completed_at=timezone.now(),
+        status=Payment.Status.PENDING,
     )
 
-    order.status = Order.Status.PAID
-    order.save(update_fields=["status"])
+    charge = Charge(payment_id=payment.pk, amount=order.total, method=payment_method)
+    transaction.on_commit(lambda: submit_charge(charge))
+    return payment
+
+
+def record_charge(payment_id: int, reference: str | None) -> None:
+    """Store the provider reference, or fail the payment the provider never accepted."""
+    if reference is None:
+        with transaction.atomic():
+            payment = (
+                Payment.objects.select_for_update()
+                .filter(pk=payment_id, status=Payment.Status.PENDING)
+                .first()
+            )
+            if payment is not None:
+                payment.status = Payment.Status.FAILED
+                payment.save(update_fields=["status"])
+                release_reservations([payment.order_id])
+    else:
+        Payment.objects.filter(pk=payment_id, provider_reference__isnull=True).update(
+            provider_reference=reference
+        )
+
+
+@transaction.atomic
+def finalize_payment(
+    payment_id: int, reference: str, payment_status: Payment.Status
+) -> Payment:
+    payment = Payment.objects.select_for_update().filter(pk=payment_id).first()
+    if payment is None:
+        raise ValidationError({"detail": _("Unknown payment")})
+    if payment.status != Payment.Status.PENDING:
+        # Providers deliver events at least once
+        if (
+            payment.status == Payment.Status.FAILED
+            and payment_status == Payment.Status.COMPLETED
+        ):
+            logger.error(
+                "Payment %s completed after it failed or expired, it needs a refund",
+                payment.pk,
+            )
+        return payment
+    if payment.provider_reference not in (None, reference):
+        raise ValidationError({"detail": _("Payment reference does not match")})
+
+    payment.provider_reference = reference
+    payment.status = payment_status
+    if payment_status == Payment.Status.COMPLETED:
+        payment.completed_at = timezone.now()
+        transition_orders(
+            Order.objects.filter(pk=payment.order_id),
+            Order.Status.WAITING_PAYMENT,
+            Order.Status.PAID,
+        )
+        commit_reservations([payment.order_id])
+    else:
+        release_reservations([payment.order_id])
+    payment.save(update_fields=["provider_reference", "status", "completed_at"])
 
     return payment
+
+
+def handle_webhook(body: bytes, signature: str) -> Payment:
+    """Verify and apply a provider event `{"payment", "reference", "status"}`."""
+    if not verify_webhook(body, signature):
+        raise PermissionDenied(_("Invalid webhook signature"))
+
+    try:
+        event = json.loads(body)
+        payment_id = int(event["payment"])
+        reference = str(event["reference"])
+        payment_status = Payment.Status(event["status"])
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError({"detail": _("Invalid webhook event")})
+    if payment_status == Payment.Status.PENDING:
+        raise ValidationError({"detail": _("Invalid webhook event")})
+
+    return finalize_payment(payment_id, reference, payment_status)
+
+
+@transaction.atomic
+def run_idempotent(
+    user: User,
+    key: str,
+    request_fingerprint: str,
+    handler: Callable[[], tuple[int, Any]],
+) -> tuple[int, Any, bool]:
+    """
+    Run `handler` once per `Idempotency-Key` of `user` and store the
+    `(status, data)` it returns. Retries with the same key wait for the first
+    request to finish and get its stored result back, flagged as replayed.
+    """
+    IdempotencyKey.objects.filter(
+        user=user,
+        key=key,
+        created_at__lt=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+    ).delete()
+
+    record, created = IdempotencyKey.objects.select_for_update().get_or_create(
+        user=user, key=key, defaults={"request_fingerprint": request_fingerprint}
+    )
+    if not created:
+        if record.request_fingerprint != request_fingerprint:
+            raise ValidationError(
+                {"detail": _("Idempotency-Key was already used for another request")}
+            )
+        return record.response_status, record.response_data, True  # type: ignore
+
+    response_status, response_data = handler()
+    record.response_status = response_status
+    record.response_data = response_data
+    record.save(update_fields=["response_status", "response_data"])
+    return response_status, response_data, False
+
+
+def purge_idempotency_keys(batch_size: int = 1000) -> int:
+    """Delete expired idempotency keys in batches, returns how many were deleted."""
+    expired_qs = IdempotencyKey.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    )
+
+    deleted = 0
+    while pks := list(expired_qs.values_list("pk", flat=True)[:batch_size]):
+        deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+    return deleted
+
+
+def merge_duplicate_carts(batch_size: int = 500) -> tuple[int, int, int]:
+    """
+    Leave every user with a single open cart (`WAITING_PAYMENT` order), as the
+    `unique_open_cart_per_user` constraint requires. Pending payments of these
+    carts are failed, then the newest cart is kept and receives the items of
+    the others. Merged carts are deleted, or cancelled when they have payments
+    to keep. Works through `batch_size` users per transaction and returns the
+    number of users, deleted and cancelled carts.
+    """
+    duplicated_users = (
+        Order.objects.filter(status=Order.Status.WAITING_PAYMENT, user__isnull=False)
+        .values("user_id")
+        .annotate(carts=Count("pk"))
+        .filter(carts__gt=1)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+    )
+
+    users = deleted = cancelled = 0
+    while user_ids := list(duplicated_users[:batch_size]):
+        with transaction.atomic():
+            for user_id in user_ids:
+                user_deleted, user_cancelled = _merge_user_carts(user_id)
+                deleted += user_deleted
+                cancelled += user_cancelled
+        users += len(user_ids)
+
+    return users, deleted, cancelled
+
+
+def _merge_user_carts(user_id: Any) -> tuple[int, int]:
+    carts = list(
+        Order.objects.select_for_update()
+        .filter(user_id=user_id, status=Order.Status.WAITING_PAYMENT)
+        .order_by("-created_at")
+    )
+    # Items of a cart being paid can not change, its payment is failed first.
+    # A late "completed" webhook is then logged for a refund, see `finalize_payment`
+    pending_payments = list(
+        Payment.objects.select_for_update()
+        .filter(order__in=carts, status=Payment.Status.PENDING)
+        .values_list("pk", "order_id")
+    )
+    Payment.objects.filter(pk__in=[pk for pk, _ in pending_payments]).update(
+        status=Payment.Status.FAILED
+    )
+    release_reservations([order_id for _, order_id in pending_payments])
+
+    cart, *duplicates = carts
+    lines = {(item.flower_id, item.bouquet_id): item for item in cart.items.all()}
+    for item in OrderItem.objects.filter(order__in=duplicates).order_by("pk"):
+        key = (item.flower_id, item.bouquet_id)
+        if key in lines:
+            lines[key].quantity += item.quantity
+        else:
+            item.order = cart
+            lines[key] = item
+    OrderItem.objects.filter(order__in=duplicates).exclude(
+        pk__in=[item.pk for item in lines.values()]
+    ).delete()
+    OrderItem.objects.bulk_update(lines.values(), ["order", "quantity"])
+
+    cart.total = sum((item.price for item in lines.values()), start=Decimal(0))
+    cart.save(update_fields=["total"])
+
+    duplicate_ids = [order.pk for order in duplicates]
+    cancelled = len(
+        transition_orders(
+            Order.objects.filter(pk__in=duplicate_ids).filter(
+                Exists(Payment.objects.filter(order_id=OuterRef("pk")))
+            ),
+            Order.Status.WAITING_PAYMENT,
+            Order.Status.CANCELLED,
+            total=0,
+        )
+    )
+    deleted = Order.objects.filter(
+        pk__in=duplicate_ids, status=Order.Status.WAITING_PAYMENT
+    ).delete()[1].get(Order._meta.label, 0)
+    return deleted, cancelled
+
+
+def sweep_abandoned_carts(
+    older_than: timedelta | None = None, batch_size: int = 500, pause: float = 0
+) -> tuple[int, int]:
+    """
+    Remove open carts (`WAITING_PAYMENT` orders) untouched for `older_than`,
+    `ABANDONED_CART_AGE` seconds by default. Carts with failed payments are
+    cancelled to keep the payment history, the others are deleted with their
+    items. Carts being paid are left alone. Works through `batch_size` carts per
+    short transaction, sleeping `pause` seconds in between, and skips carts
+    locked by a request. Returns the number of deleted and cancelled carts.
+    """
+    if older_than is None:
+        older_than = timedelta(seconds=settings.ABANDONED_CART_AGE)
+    abandoned = (
+        Order.objects.filter(
+            status=Order.Status.WAITING_PAYMENT,
+            updated_at__lt=timezone.now() - older_than,
+        )
+        .exclude(
+            Exists(
+                Payment.objects.filter(
+                    order_id=OuterRef("pk"), status=Payment.Status.PENDING
+                )
+            )
+        )
+        .order_by("updated_at", "pk")
+    )
+
+    deleted = cancelled = 0
+    last = None
+    while True:
+        with transaction.atomic():
+            batch = abandoned.select_for_update(skip_locked=True)
+            if last is not None:
+                # Keyset pagination, skipped carts are not selected again
+                batch = batch.filter(
+                    Q(updated_at__gt=last[0]) | Q(updated_at=last[0], pk__gt=last[1])
+                )
+            carts = list(batch.values_list("updated_at", "pk")[:batch_size])
+            if not carts:
+                break
+            last = carts[-1]
+
+            cart_ids = [pk for _, pk in carts]
+            release_reservations(cart_ids)
+            cancelled += len(
+                transition_orders(
+                    Order.objects.filter(pk__in=cart_ids).filter(
+                        Exists(Payment.objects.filter(order_id=OuterRef("pk")))
+                    ),
+                    Order.Status.WAITING_PAYMENT,
+                    Order.Status.CANCELLED,
+                )
+            )
+            deleted += (
+                Order.objects.filter(
+                    pk__in=cart_ids, status=Order.Status.WAITING_PAYMENT
+                )
+                .delete()[1]
+                .get(Order._meta.label, 0)
+            )
+
+        if pause:
+            time.sleep(pause)
+
+    return deleted, cancelled
@@ -0,0 +1,172 @@
+from datetime import timedelta
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+
+from flowers.cache import bump_catalog_version
+from flowers.models import BouquetFlower, Flower
+from flowers.services import refresh_flower_bouquets_availability
+from orders.models import Order, OrderItem, Payment, StockReservation
+
+
+def get_flower_demand(order: Order) -> dict[Any, int]:
+    """
+    Flower units `order` needs, bouquets exploded through
+    `BouquetFlower.quantity`, computed in a single query.
+    """
+    flower_items = OrderItem.objects.filter(order=order, flower__isnull=False)
+    bouquet_flowers = BouquetFlower.objects.filter(bouquet__order_items__order=order)
+
+    flower_demand = (
+        flower_items.filter(flower_id=OuterRef("pk"))
+        .values("flower_id")
+        .annotate(demand=Sum("quantity"))
+        .values("demand")
+    )
+    bouquet_demand = (
+        bouquet_flowers.filter(flower_id=OuterRef("pk"))
+        .values("flower_id")
+        .annotate(demand=Sum(F("quantity") * F("bouquet__order_items__quantity")))
+        .values("demand")
+    )
+    return dict(
+        Flower.objects.filter(
+            Q(pk__in=flower_items.values("flower_id"))
+            | Q(pk__in=bouquet_flowers.values("flower_id"))
+        )
+        .annotate(
+            demand=Coalesce(Subquery(flower_demand), 0)
+            + Coalesce(Subquery(bouquet_demand), 0)
+        )
+        .values_list("pk", "demand")
+    )
+
+
+def _per_flower(quantities: dict[Any, int]) -> Case:
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _stock_changed(flower_ids: Iterable[Any], crossed_zero: bool) -> None:
+    """Bouquet availability and cached catalog pages follow the new stock."""
+    if refresh_flower_bouquets_availability(flower_ids) or crossed_zero:
+        transaction.on_commit(bump_catalog_version)
+
+
+@transaction.atomic
+def reserve_stock(order: Order) -> list[StockReservation]:
+    """
+    Take the stock `order` needs out of `Flower.stock` with one conditional
+    UPDATE, so concurrent checkouts can never sell the same units. Raises a
+    `ValidationError` and changes nothing when any flower is short.
+    """
+    demand = get_flower_demand(order)
+    if not demand:
+        return []
+
+    enough_stock = Q()
+    for pk, quantity in demand.items():
+        enough_stock |= Q(pk=pk, stock__gte=quantity)
+    updated = Flower.objects.filter(enough_stock).update(
+        stock=F("stock") - _per_flower(demand)
+    )
+    if updated != len(demand):
+        raise ValidationError(
+            {"detail": _("Currently one of the order products is not in stock")}
+        )
+
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    reservations = StockReservation.objects.bulk_create(
+        StockReservation(
+            order=order, flower_id=pk, quantity=quantity, expires_at=expires_at
+        )
+        for pk, quantity in demand.items()
+    )
+
+    _stock_changed(
+        demand.keys(), Flower.objects.filter(pk__in=demand.keys(), stock=0).exists()
+    )
+    return reservations
+
+
+@transaction.atomic
+def commit_reservations(order_ids: Iterable[Any]) -> int:
+    """The orders are paid, their reserved units are sold for good."""
+    return StockReservation.objects.filter(order_id__in=order_ids).delete()[0]
+
+
+@transaction.atomic
+def release_reservations(order_ids: Iterable[Any]) -> int:
+    """Put the units reserved for `order_ids` back into stock, set-based."""
+    # Lock first, so that a reservation released or committed concurrently is
+    # not put back twice
+    reservation_ids = list(
+        StockReservation.objects.select_for_update()
+        .filter(order_id__in=order_ids)
+        .values_list("pk", flat=True)
+    )
+    if not reservation_ids:
+        return 0
+
+    reservations = StockReservation.objects.filter(pk__in=reservation_ids)
+    released = (
+        reservations.filter(flower_id=OuterRef("pk"))
+        .values("flower_id")
+        .annotate(quantity=Sum("quantity"))
+        .values("quantity")
+    )
+    flower_ids = list(reservations.values_list("flower_id", flat=True).distinct())
+    crossed_zero = Flower.objects.filter(pk__in=flower_ids, stock=0).exists()
+    Flower.objects.filter(pk__in=flower_ids).update(
+        stock=F("stock") + Subquery(released)
+    )
+    reservations.delete()
+
+    _stock_changed(flower_ids, crossed_zero)
+    return len(reservation_ids)
+
+
+def release_expired_reservations(batch_size: int = 500) -> tuple[int, int]:
+    """
+    Release the reservations of orders whose payment did not finish in time and
+    fail their pending payments, `batch_size` orders per transaction. Returns
+    the number of orders and reservations released.
+    """
+    released_orders = released_reservations = 0
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                StockReservation.objects.filter(expires_at__lt=timezone.now())
+                .order_by("order_id")
+                .values_list("order_id", flat=True)
+                .distinct()[:batch_size]
+            )
+            if not order_ids:
+                break
+
+            # A late "completed" webhook is then ignored, see `finalize_payment`
+            Payment.objects.filter(
+                order_id__in=order_ids, status=Payment.Status.PENDING
+            ).update(status=Payment.Status.FAILED)
+            released_reservations += release_reservations(order_ids)
+            released_orders += len(order_ids)
+
+    return released_orders, released_reservations
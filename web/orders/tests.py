@@ -1,15 +1,51 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from threading import Barrier
+from unittest import skipUnless
+from uuid import uuid4
+
+from django.apps import apps
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import Promise
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import ValidationError as DRFValidationError
+from rest_framework.test import APIClient, APITestCase
 
-from flowers.models import Flower
-from orders.models import Order, OrderItem, Payment
-from orders.services import create_order_item
+from flowers.models import Bouquet, BouquetCategory, BouquetFlower, Flower
+from orders.admin import status_action
+from orders.models import (
+    IdempotencyKey,
+    Order,
+    OrderItem,
+    OrderStatusTransition,
+    Payment,
+    StockReservation,
+)
+from orders.payments import get_provider, sign_webhook
+from orders.services import (
+    complete_order_payment,
+    create_order_item,
+    delete_order_item,
+    handle_webhook,
+    update_order_item,
+)
+from orders.transitions import transition_order, transition_orders
 from users.models import User
 
 
+@override_settings(PAYMENT_PROVIDER_EAGER=True)
 class OrderAPITestCase(APITestCase):
     def setUp(self):
+        # The local gateway remembers charges by payment id
+        get_provider.cache_clear()
         self.user = User.objects.create_user(
             email="user@mail.com",
             password="1234",
@@ -19,7 +55,7 @@ class OrderAPITestCase(APITestCase):
         )
         self.client.force_authenticate(user=self.user)
         self.flower = Flower.objects.create(
-            name="Tulipan", price=5, can_be_sold_separately=True
+            name="Tulipan", price=5, can_be_sold_separately=True, stock=100
         )
         self.order = Order.objects.create(user=self.user)
 
@@ -27,7 +63,22 @@ class OrderAPITestCase(APITestCase):
         url = reverse("orders:order-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response.data) >= 1)
+        self.assertTrue(len(response.data["results"]) >= 1)
+
+    def test_order_list_cursor_pagination(self):
+        Order.objects.bulk_create(
+            Order(user=self.user, status=Order.Status.PAID) for _ in range(4)
+        )
+        url = reverse("orders:order-list")
+
+        response = self.client.get(f"{url}?page_size=3")
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertIsNone(response.data["previous"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
+        self.assertIsNotNone(response.data["previous"])
 
     def test_order_create(self):
         url = reverse("orders:order-list")
@@ -36,20 +87,809 @@ class OrderAPITestCase(APITestCase):
             response.status_code, [status.HTTP_200_OK, status.HTTP_201_CREATED]
         )
 
+    def test_order_create_returns_open_cart(self):
+        create_order_item(order=self.order, flower=self.flower, quantity=1)
+        url = reverse("orders:order-list")
+
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], str(self.order.pk))
+
+        self.order.status = Order.Status.PAID
+        self.order.save()
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(response.data["id"], str(self.order.pk))
+
+    def test_single_open_cart_per_user(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(user=self.user)
+
+    def _duplicate_carts(self) -> tuple[Order, Order, Order]:
+        rose = Flower.objects.create(
+            name="Rose", price=3, can_be_sold_separately=True, stock=100
+        )
+        create_order_item(order=self.order, flower=self.flower, quantity=1)
+        # Carts created before the constraint existed, the index comes back
+        # when the test transaction is rolled back
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX unique_open_cart_per_user")
+        empty = Order.objects.create(user=self.user)
+        paying = Order.objects.create(user=self.user)
+        failed = Order.objects.create(user=self.user)
+        create_order_item(order=paying, flower=self.flower, quantity=2)
+        # The charge is not sent, the payment stays pending
+        complete_order_payment(paying, Payment.Method.BLIK)
+        create_order_item(order=failed, flower=rose, quantity=4)
+        Payment.objects.create(
+            order=failed, method=Payment.Method.BLIK, status=Payment.Status.FAILED
+        )
+        return empty, paying, failed
+
+    def _assert_carts_merged(self, empty: Order, paying: Order, failed: Order) -> None:
+        cart = Order.objects.get(user=self.user, status=Order.Status.WAITING_PAYMENT)
+        self.assertEqual(cart, failed)
+        self.assertEqual(
+            dict(cart.items.values_list("flower__name", "quantity")),
+            {"Tulipan": 3, "Rose": 4},
+        )
+        self.assertEqual(cart.total, Decimal("27"))
+        self.assertFalse(
+            Order.objects.filter(pk__in=[empty.pk, self.order.pk]).exists()
+        )
+        # Not merged while its charge was running, the payment failed first
+        paying.refresh_from_db()
+        self.assertEqual(paying.status, Order.Status.CANCELLED)
+        self.assertEqual(paying.payments.get().status, Payment.Status.FAILED)
+
+    def test_merge_duplicate_carts(self):
+        empty, paying, failed = self._duplicate_carts()
+
+        out = StringIO()
+        call_command("merge_duplicate_carts", stdout=out)
+
+        self.assertIn("deleted 2 and cancelled 1 carts", out.getvalue())
+        self._assert_carts_merged(empty, paying, failed)
+        self.assertEqual(
+            list(paying.status_transitions.values_list("to_status", flat=True)),
+            [Order.Status.CANCELLED],
+        )
+        self.flower.refresh_from_db()
+        self.assertEqual(self.flower.stock, 100)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_merge_duplicate_carts_migration(self):
+        migration = import_module("orders.migrations.0012_unique_open_cart_per_user")
+        empty, paying, failed = self._duplicate_carts()
+
+        migration.merge_duplicate_carts(apps, connection.schema_editor())
+
+        self._assert_carts_merged(empty, paying, failed)
+        # Put back by `release_expired_reservations`
+        self.assertFalse(
+            StockReservation.objects.filter(expires_at__gt=timezone.now()).exists()
+        )
+
+    def test_sweep_abandoned_carts(self):
+        def cart_of(email: str) -> Order:
+            user = User.objects.create_user(
+                email=email, password="1234", phone=f"+4850000{User.objects.count():04}"
+            )
+            return Order.objects.create(user=user)
+
+        create_order_item(order=self.order, flower=self.flower, quantity=1)
+        abandoned = cart_of("abandoned@mail.com")
+        create_order_item(order=abandoned, flower=self.flower, quantity=2)
+        declined = cart_of("declined@mail.com")
+        Payment.objects.create(
+            order=declined, method=Payment.Method.BLIK, status=Payment.Status.FAILED
+        )
+        paying = cart_of("paying@mail.com")
+        Payment.objects.create(order=paying, method=Payment.Method.BLIK)
+        paid = cart_of("paid@mail.com")
+        Order.objects.filter(pk=paid.pk).update(status=Order.Status.PAID)
+        Order.objects.exclude(pk=self.order.pk).update(
+            updated_at=timezone.now() - timedelta(days=31)
+        )
+        # Adding an item keeps an old cart alive
+        touched = cart_of("touched@mail.com")
+        Order.objects.filter(pk=touched.pk).update(
+            updated_at=timezone.now() - timedelta(days=31)
+        )
+        create_order_item(order=touched, flower=self.flower, quantity=1)
+
+        out = StringIO()
+        call_command("sweep_abandoned_carts", "--batch-size", "1", stdout=out)
+
+        self.assertIn("Deleted 1 and cancelled 1 abandoned carts", out.getvalue())
+        self.assertFalse(Order.objects.filter(pk=abandoned.pk).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id=abandoned.pk).exists())
+        self.assertEqual(
+            dict(Order.objects.values_list("pk", "status")),
+            {
+                self.order.pk: Order.Status.WAITING_PAYMENT,
+                declined.pk: Order.Status.CANCELLED,
+                paying.pk: Order.Status.WAITING_PAYMENT,
+                paid.pk: Order.Status.PAID,
+                touched.pk: Order.Status.WAITING_PAYMENT,
+            },
+        )
+
     def test_order_item_merge_logic(self):
         OrderItem.objects.create(order=self.order, flower=self.flower, quantity=2)
         item = create_order_item(order=self.order, flower=self.flower, quantity=3)
         self.assertEqual(item.quantity, 5)
 
+    def test_order_item_bulk_add(self):
+        bouquet = Bouquet.objects.create(name="Spring", price=Decimal("40.35"))
+        create_order_item(order=self.order, flower=self.flower, quantity=2)
+        url = reverse("orders:order-item-bulk", args=[self.order.pk])
+
+        response = self.client.post(
+            url,
+            {
+                "items": [
+                    {"flower": str(self.flower.pk), "quantity": 3},
+                    {"bouquet": str(bouquet.pk), "quantity": 2},
+                    {"flower": str(self.flower.pk), "quantity": 1},
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 2)
+        quantities = dict(self.order.items.values_list("flower", "quantity"))
+        self.assertEqual(quantities, {self.flower.pk: 6, None: 2})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("110.70"))
+
+    def test_order_item_bulk_add_reports_errors_per_line(self):
+        bouquet = Bouquet.objects.create(name="Spring", price=40)
+        url = reverse("orders:order-item-bulk", args=[self.order.pk])
+
+        response = self.client.post(
+            url,
+            {
+                "items": [
+                    {"flower": str(self.flower.pk), "quantity": 1},
+                    {"bouquet": str(bouquet.pk), "quantity": 51},
+                    {"flower": str(uuid4()), "quantity": 1},
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data["items"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("quantity", errors[1])
+        self.assertIn("flower", errors[2])
+        self.assertFalse(self.order.items.exists())
+
+    def test_order_item_bulk_add_refused_after_payment(self):
+        Order.objects.filter(pk=self.order.pk).update(status=Order.Status.PAID)
+        url = reverse("orders:order-item-bulk", args=[self.order.pk])
+
+        response = self.client.post(
+            url,
+            {"items": [{"flower": str(self.flower.pk), "quantity": 1}]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.order.items.exists())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("0"))
+
+    def test_order_item_add_existing_product(self):
+        url = reverse("orders:order-item-list", args=[self.order.pk])
+        for _ in range(2):
+            response = self.client.post(url, {"flower": self.flower.pk, "quantity": 2})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(self.order.items.get().quantity, 4)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("20"))
+
+    def test_order_item_merge_respects_max_quantity(self):
+        bouquet = Bouquet.objects.create(name="Spring", price=40)
+        create_order_item(order=self.order, bouquet=bouquet, quantity=45)
+
+        with self.assertRaises(DRFValidationError):
+            create_order_item(order=self.order, bouquet=bouquet, quantity=10)
+
+        self.assertEqual(self.order.items.get().quantity, 45)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("1800"))
+
+    def test_order_item_unique_per_product(self):
+        OrderItem.objects.create(order=self.order, flower=self.flower, quantity=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OrderItem.objects.create(order=self.order, flower=self.flower, quantity=1)
+
     def test_order_pay(self):
         OrderItem.objects.create(order=self.order, flower=self.flower, quantity=1)
         self.order.status = Order.Status.WAITING_PAYMENT
         self.order.save()
 
         url = reverse("orders:order-pay", args=[self.order.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {"method": Payment.Method.BLIK.value})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], Payment.Status.PENDING)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.PAID)
+        payment = Payment.objects.get(order=self.order)
+        self.assertEqual(payment.status, Payment.Status.COMPLETED)
+        self.assertTrue(payment.provider_reference.startswith("local_"))
+        self.assertEqual(
+            list(self.order.status_transitions.values_list("from_status", "to_status")),
+            [(Order.Status.WAITING_PAYMENT, Order.Status.PAID)],
+        )
+
+    @override_settings(LOCAL_GATEWAY_OUTCOME="failed")
+    def test_order_pay_declined(self):
+        OrderItem.objects.create(order=self.order, flower=self.flower, quantity=1)
+        url = reverse("orders:order-pay", args=[self.order.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {"method": Payment.Method.BLIK.value})
+
+        self.assertEqual(Payment.objects.get().status, Payment.Status.FAILED)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.WAITING_PAYMENT)
+
+    @override_settings(
+        LOCAL_GATEWAY_OUTCOME="error",
+        PAYMENT_PROVIDER_RETRIES=2,
+        PAYMENT_PROVIDER_BACKOFF=0,
+    )
+    def test_order_pay_provider_unavailable(self):
+        OrderItem.objects.create(order=self.order, flower=self.flower, quantity=1)
+        url = reverse("orders:order-pay", args=[self.order.pk])
+        with (
+            self.assertLogs("orders.payments", "WARNING") as logs,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            self.client.post(url, {"method": Payment.Method.BLIK.value})
+
+        self.assertEqual(len(logs.records), 3)
+        self.assertEqual(Payment.objects.get().status, Payment.Status.FAILED)
+
+        # A failed payment does not block paying again
         response = self.client.post(url, {"method": Payment.Method.BLIK.value})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_order_pay_while_pending(self):
+        OrderItem.objects.create(order=self.order, flower=self.flower, quantity=1)
+        url = reverse("orders:order-pay", args=[self.order.pk])
+
+        response = self.client.post(url, {"method": Payment.Method.BLIK.value})
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url, {"method": Payment.Method.BLIK.value})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def _order_flowers_and_bouquets(self) -> Bouquet:
+        bouquet = Bouquet.objects.create(name="Spring", price=40)
+        BouquetFlower.objects.create(bouquet=bouquet, flower=self.flower, quantity=3)
+        create_order_item(order=self.order, flower=self.flower, quantity=2)
+        create_order_item(order=self.order, bouquet=bouquet, quantity=2)
+        return bouquet
+
+    def test_order_pay_reserves_stock(self):
+        self._order_flowers_and_bouquets()
+        url = reverse("orders:order-pay", args=[self.order.pk])
+
+        response = self.client.post(url, {"method": Payment.Method.BLIK.value})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.flower.refresh_from_db()
+        # 2 flowers and 2 bouquets of 3
+        self.assertEqual(self.flower.stock, 92)
+        reservation = StockReservation.objects.get(order=self.order)
+        self.assertEqual(reservation.quantity, 8)
+
+    def test_order_pay_insufficient_stock(self):
+        self._order_flowers_and_bouquets()
+        Flower.objects.filter(pk=self.flower.pk).update(stock=7)
+        url = reverse("orders:order-pay", args=[self.order.pk])
+
+        response = self.client.post(url, {"method": Payment.Method.BLIK.value})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.flower.refresh_from_db()
+        self.assertEqual(self.flower.stock, 7)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(Payment.objects.exists())
+
+    def test_order_paid_keeps_stock_sold(self):
+        self._order_flowers_and_bouquets()
+        url = reverse("orders:order-pay", args=[self.order.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {"method": Payment.Method.BLIK.value})
+
+        self.flower.refresh_from_db()
+        self.assertEqual(self.flower.stock, 92)
+        self.assertFalse(StockReservation.objects.exists())
+
+    @override_settings(LOCAL_GATEWAY_OUTCOME="failed")
+    def test_order_pay_declined_releases_stock(self):
+        self._order_flowers_and_bouquets()
+        url = reverse("orders:order-pay", args=[self.order.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {"method": Payment.Method.BLIK.value})
+
+        self.flower.refresh_from_db()
+        self.assertEqual(self.flower.stock, 100)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_order_items_locked_once_paid(self):
+        self._order_flowers_and_bouquets()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("orders:order-pay", args=[self.order.pk]),
+                {"method": Payment.Method.BLIK.value},
+            )
+        item = self.order.items.get(flower=self.flower)
+        url = reverse("orders:order-item-detail", args=[self.order.pk, item.pk])
+
+        # The stock of the paid items is already taken, more would be oversold
+        self.assertEqual(
+            self.client.patch(url, {"quantity": 50}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(
+            self.client.delete(url).status_code, status.HTTP_400_BAD_REQUEST
+        )
+
+        self.flower.refresh_from_db()
+        self.assertEqual(self.flower.stock, 92)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 2)
         self.order.refresh_from_db()
         self.assertEqual(self.order.status, Order.Status.PAID)
-        self.assertTrue(Payment.objects.filter(order=self.order).exists())
+
+    def test_release_expired_reservations(self):
+        bouquet = self._order_flowers_and_bouquets()
+        url = reverse("orders:order-pay", args=[self.order.pk])
+        self.client.post(url, {"method": Payment.Method.BLIK.value})
+        Flower.objects.filter(pk=self.flower.pk).update(stock=4)
+        StockReservation.objects.update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        out = StringIO()
+        call_command("release_expired_reservations", stdout=out)
+
+        self.assertIn("Released 1 reservations of 1 orders", out.getvalue())
+        self.flower.refresh_from_db()
+        self.assertEqual(self.flower.stock, 12)
+        bouquet.refresh_from_db()
+        self.assertTrue(bouquet.is_available)
+        payment = Payment.objects.get()
+        self.assertEqual(payment.status, Payment.Status.FAILED)
+
+        # The provider answers after the reservation expired
+        body = json.dumps(
+            {"payment": payment.pk, "reference": "ref_1", "status": "completed"}
+        ).encode()
+        with self.assertLogs("orders.services", "ERROR"):
+            handle_webhook(body, sign_webhook(body))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.WAITING_PAYMENT)
+
+    def test_payment_webhook(self):
+        payment = Payment.objects.create(order=self.order, method=Payment.Method.BLIK)
+        url = reverse("orders:payment-webhook")
+        body = json.dumps(
+            {"payment": payment.pk, "reference": "ref_1", "status": "completed"}
+        ).encode()
+        self.client.force_authenticate(user=None)
+
+        response = self.client.post(
+            url, body, content_type="application/json", HTTP_X_SIGNATURE="forged"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        for _ in range(2):
+            response = self.client.post(
+                url,
+                body,
+                content_type="application/json",
+                HTTP_X_SIGNATURE=sign_webhook(body),
+            )
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.Status.COMPLETED)
+        self.assertEqual(payment.provider_reference, "ref_1")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.PAID)
+
+    def test_order_pay_idempotency_key_replays_result(self):
+        OrderItem.objects.create(order=self.order, flower=self.flower, quantity=1)
+        url = reverse("orders:order-pay", args=[self.order.pk])
+        data = {"method": Payment.Method.BLIK.value}
+
+        first = self.client.post(url, data, HTTP_IDEMPOTENCY_KEY="pay-1")
+        retry = self.client.post(url, data, HTTP_IDEMPOTENCY_KEY="pay-1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data["id"], first.data["id"])
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+        # Same key for a different request
+        response = self.client.post(
+            url, {"method": Payment.Method.PAYPAL.value}, HTTP_IDEMPOTENCY_KEY="pay-1"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_pay_idempotency_key_replays_failure(self):
+        url = reverse("orders:order-pay", args=[self.order.pk])
+        data = {"method": Payment.Method.BLIK.value}
+
+        response = self.client.post(url, data, HTTP_IDEMPOTENCY_KEY="pay-1")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        OrderItem.objects.create(order=self.order, flower=self.flower, quantity=1)
+        response = self.client.post(url, data, HTTP_IDEMPOTENCY_KEY="pay-1")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.exists())
+
+        response = self.client.post(url, data, HTTP_IDEMPOTENCY_KEY="pay-2")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_purge_idempotency_keys(self):
+        fresh = IdempotencyKey.objects.create(user=self.user, key="fresh")
+        expired = IdempotencyKey.objects.create(user=self.user, key="expired")
+        IdempotencyKey.objects.filter(pk=expired.pk).update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+
+        self.assertIn("Deleted 1", out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.all()), [fresh])
+
+    def test_order_pay_unavailable_bouquet(self):
+        bouquet = Bouquet.objects.create(name="Spring", price=40)
+        bouquet.flowers.add(self.flower)
+        OrderItem.objects.create(order=self.order, bouquet=bouquet, quantity=1)
+        self.flower.stock = 0
+        self.flower.save()
+
+        url = reverse("orders:order-pay", args=[self.order.pk])
+        response = self.client.post(url, {"method": Payment.Method.BLIK.value})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.filter(order=self.order).exists())
+
+    def test_order_total_maintained_by_services(self):
+        bouquet = Bouquet.objects.create(name="Spring", price=Decimal("40.35"))
+        rose = Flower.objects.create(
+            name="Rose", price=Decimal("3.33"), can_be_sold_separately=True, stock=100
+        )
+        create_order_item(order=self.order, flower=self.flower, quantity=1)
+        create_order_item(order=self.order, flower=self.flower, quantity=2)
+        rose_item = create_order_item(order=self.order, flower=rose, quantity=7)
+        bouquet_item = create_order_item(order=self.order, bouquet=bouquet, quantity=2)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("119.01"))
+
+        update_order_item(rose_item, quantity=1)
+        delete_order_item(bouquet_item)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("18.33"))
+
+        url = reverse("orders:order-detail", args=[self.order.pk])
+        self.assertEqual(self.client.get(url).data["total_price"], Decimal("18.33"))
+
+    def test_order_item_price_snapshot(self):
+        item = create_order_item(order=self.order, flower=self.flower, quantity=2)
+        self.assertEqual(item.unit_price, Decimal("5"))
+
+        self.flower.price = Decimal("9.99")
+        self.flower.save()
+        create_order_item(order=self.order, flower=self.flower, quantity=1)
+
+        item.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(item.unit_price, Decimal("5"))
+        self.assertEqual(self.order.total, Decimal("15"))
+
+    def test_order_item_detail_updates_total(self):
+        self.order.status = Order.Status.WAITING_PAYMENT
+        self.order.save()
+        item = create_order_item(order=self.order, flower=self.flower, quantity=2)
+        url = reverse("orders:order-item-detail", args=[self.order.pk, item.pk])
+
+        response = self.client.patch(url, {"quantity": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("25"))
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("0"))
+
+    def test_order_items_locked_while_payment_is_pending(self):
+        item = create_order_item(order=self.order, flower=self.flower, quantity=2)
+        bouquet = Bouquet.objects.create(name="Spring", price=40)
+        # The charge is not sent, the payment stays pending
+        response = self.client.post(
+            reverse("orders:order-pay", args=[self.order.pk]),
+            {"method": Payment.Method.BLIK.value},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        item_url = reverse("orders:order-item-detail", args=[self.order.pk, item.pk])
+        responses = [
+            self.client.patch(item_url, {"quantity": 5}),
+            self.client.delete(item_url),
+            self.client.post(
+                reverse("orders:order-item-list", args=[self.order.pk]),
+                {"bouquet": bouquet.pk, "quantity": 1},
+            ),
+        ]
+        for response in responses:
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        payment = Payment.objects.get(order=self.order)
+        body = json.dumps(
+            {"payment": payment.pk, "reference": "ref_1", "status": "completed"}
+        ).encode()
+        handle_webhook(body, sign_webhook(body))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.PAID)
+        self.assertEqual(self.order.total, Decimal("10"))
+        self.assertEqual(
+            list(self.order.items.values_list("flower", "quantity")),
+            [(self.flower.pk, 2)],
+        )
+
+    def test_order_item_detail_refused_after_dispatch(self):
+        item = create_order_item(order=self.order, flower=self.flower, quantity=2)
+        Order.objects.filter(pk=self.order.pk).update(status=Order.Status.IN_DELIVERY)
+        url = reverse("orders:order-item-detail", args=[self.order.pk, item.pk])
+
+        response = self.client.patch(url, {"quantity": 5})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 2)
+
+    def test_order_status_transitions(self):
+        Order.objects.filter(pk=self.order.pk).update(status=Order.Status.PAID)
+        self.order.refresh_from_db()
+
+        transition_order(self.order, Order.Status.PREPARING, self.user)
+        moved = transition_orders(
+            Order.objects.all(), Order.Status.PREPARING, Order.Status.IN_DELIVERY
+        )
+
+        self.assertEqual(moved, [self.order.pk])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.IN_DELIVERY)
+        self.assertEqual(
+            list(
+                self.order.status_transitions.values_list(
+                    "from_status", "to_status", "changed_by"
+                )
+            ),
+            [
+                (Order.Status.PAID, Order.Status.PREPARING, self.user.pk),
+                (Order.Status.PREPARING, Order.Status.IN_DELIVERY, None),
+            ],
+        )
+        with self.assertRaises(ValueError):
+            self.order.status_transitions.first().save()
+
+    def test_order_status_transition_refused(self):
+        with self.assertRaises(DRFValidationError):
+            transition_order(self.order, Order.Status.DELIVERED)
+
+        # Paid in the meantime, the stale status is not overwritten
+        stale = Order.objects.get(pk=self.order.pk)
+        Order.objects.filter(pk=self.order.pk).update(status=Order.Status.PAID)
+        with self.assertRaises(DRFValidationError):
+            transition_order(stale, Order.Status.CANCELLED)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.PAID)
+        self.assertFalse(OrderStatusTransition.objects.exists())
+
+    def test_order_status_action_label_stays_lazy(self):
+        # Built at import time, translated for each admin request
+        action = status_action(Order.Status.PAID, Order.Status.PREPARING)
+        self.assertIsInstance(action.short_description, Promise)
+        self.assertEqual(str(action.short_description), "Mark Paid orders as Preparing")
+
+
+@skipUnless(connection.features.has_select_for_update, "Needs row locks, e.g. Postgres")
+@override_settings(PAYMENT_PROVIDER_EAGER=True)
+class OrderPayConcurrencyTestCase(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        get_provider.cache_clear()
+        self.user = User.objects.create_user(
+            email="user@mail.com",
+            password="1234",
+            first_name="Alice",
+            last_name="Jones",
+            phone="+48123456789",
+        )
+        self.flower = Flower.objects.create(
+            name="Tulipan", price=5, can_be_sold_separately=True, stock=100
+        )
+        self.order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=self.order, flower=self.flower, quantity=1)
+
+    def _hammer(self, orders: list[Order], headers: dict[str, str]) -> list[int]:
+        barrier = Barrier(self.THREADS)
+
+        def pay(i: int) -> int:
+            order = orders[i % len(orders)]
+            url = reverse("orders:order-pay", args=[order.pk])
+            client = APIClient()
+            client.force_authenticate(user=order.user)
+            barrier.wait()
+            try:
+                return client.post(
+                    url, {"method": Payment.Method.BLIK.value}, headers=headers
+                ).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            return list(executor.map(pay, range(self.THREADS)))
+
+    def test_concurrent_payments_create_one_payment(self):
+        statuses = self._hammer([self.order], {})
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+    def test_concurrent_retries_with_idempotency_key(self):
+        statuses = self._hammer([self.order], {"Idempotency-Key": "pay-1"})
+        self.assertEqual(statuses, [status.HTTP_201_CREATED] * self.THREADS)
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+    def test_concurrent_checkouts_never_oversell(self):
+        self.flower.stock = 3
+        self.flower.save()
+        orders = [self.order]
+        for i in range(self.THREADS - 1):
+            user = User.objects.create_user(
+                email=f"user{i}@mail.com",
+                password="1234",
+                first_name="Bob",
+                last_name="Jones",
+                phone=f"+4812345670{i}",
+            )
+            order = Order.objects.create(user=user)
+            OrderItem.objects.create(order=order, flower=self.flower, quantity=1)
+            orders.append(order)
+
+        statuses = self._hammer(orders, {})
+
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 3)
+        self.flower.refresh_from_db()
+        self.assertEqual(self.flower.stock, 0)
+
+
+class OrderQueryBudgetTestCase(APITestCase):
+    # Authentication is forced, so these are the queries of the view itself:
+    # items with their products, flower bouquets, bouquet flowers, the bouquets
+    # of those flowers and categories, plus orders and payments for orders
+    ORDER_QUERIES = 7
+    ORDER_ITEM_QUERIES = 5
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@mail.com",
+            password="1234",
+            first_name="Alice",
+            last_name="Jones",
+            phone="+48123456789",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = BouquetCategory.objects.create(name="Love")
+        self.order = Order.objects.create(user=self.user)
+        self.counter = 0
+
+    def _add_items(self, count: int) -> None:
+        for _ in range(count):
+            self.counter += 1
+            flower = Flower.objects.create(
+                name=f"Flower {self.counter}",
+                price=5,
+                can_be_sold_separately=True,
+                stock=100,
+            )
+            bouquet = Bouquet.objects.create(name=f"Bouquet {self.counter}", price=40)
+            bouquet.flowers.add(flower)
+            bouquet.categories.add(self.category)
+            create_order_item(order=self.order, flower=flower, quantity=1)
+            create_order_item(order=self.order, bouquet=bouquet, quantity=1)
+        # Not pending, items can not be added while a payment is
+        Payment.objects.create(
+            order=self.order, method=Payment.Method.BLIK, status=Payment.Status.FAILED
+        )
+
+    def _assert_budget(self, budget: int, url: str) -> None:
+        for count in [1, 10]:
+            self._add_items(count)
+            with self.assertNumQueries(budget):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_order_list_query_budget(self):
+        self._assert_budget(self.ORDER_QUERIES, reverse("orders:order-list"))
+
+    def test_order_detail_query_budget(self):
+        self._assert_budget(
+            self.ORDER_QUERIES, reverse("orders:order-detail", args=[self.order.pk])
+        )
+
+    def test_order_item_list_query_budget(self):
+        self._assert_budget(
+            self.ORDER_ITEM_QUERIES,
+            reverse("orders:order-item-list", args=[self.order.pk]),
+        )
+
+    def test_order_item_detail_query_budget(self):
+        self._add_items(1)
+        item = self.order.items.filter(bouquet__isnull=False).get()
+        url = reverse("orders:order-item-detail", args=[self.order.pk, item.pk])
+        # A bouquet item, nothing to prefetch for `flower__bouquets`
+        with self.assertNumQueries(self.ORDER_ITEM_QUERIES - 1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@skipUnless(connection.features.has_select_for_update, "Needs row locks, e.g. Postgres")
+class OrderItemConcurrencyTestCase(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@mail.com",
+            password="1234",
+            first_name="Alice",
+            last_name="Jones",
+            phone="+48123456789",
+        )
+        self.order = Order.objects.create(user=self.user)
+
+    def test_concurrent_additions_of_a_new_product(self):
+        bouquet = Bouquet.objects.create(name="Spring", price=40)
+        barrier = Barrier(self.THREADS)
+
+        def add(i: int) -> int:
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            barrier.wait()
+            try:
+                if i % 2:
+                    url = reverse("orders:order-item-list", args=[self.order.pk])
+                    data = {"bouquet": bouquet.pk, "quantity": 1}
+                    return client.post(url, data).status_code
+                url = reverse("orders:order-item-bulk", args=[self.order.pk])
+                data = {"items": [{"bouquet": str(bouquet.pk), "quantity": 1}]}
+                return client.post(url, data, format="json").status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            statuses = list(executor.map(add, range(self.THREADS)))
+
+        self.assertEqual(statuses, [status.HTTP_201_CREATED] * self.THREADS)
+        self.assertEqual(self.order.items.get(bouquet=bouquet).quantity, self.THREADS)
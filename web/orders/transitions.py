@@ -0,0 +1,89 @@
+from typing import Any
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+
+from orders.models import Order, OrderStatusTransition
+from users.models import User
+
+Status = Order.Status
+
+# Status an order can move to from each status, anything else is refused
+TRANSITIONS: dict[str, set[str]] = {
+    Status.WAITING_PAYMENT: {Status.PAID, Status.CANCELLED},
+    Status.PAID: {Status.PREPARING, Status.CANCELLED, Status.REFUNDED},
+    Status.PREPARING: {Status.IN_DELIVERY, Status.CANCELLED, Status.REFUNDED},
+    Status.IN_DELIVERY: {Status.DELIVERED},
+    Status.DELIVERED: {Status.REFUNDED},
+    Status.CANCELLED: set(),
+    Status.REFUNDED: set(),
+}
+
+
+def can_transition(from_status: str, to_status: str) -> bool:
+    return to_status in TRANSITIONS[from_status]
+
+
+@transaction.atomic
+def transition_orders(
+    orders: QuerySet[Order],
+    from_status: str,
+    to_status: str,
+    changed_by: User | None = None,
+    **changes: Any,
+) -> list[Any]:
+    """
+    Move the `orders` still in `from_status` to `to_status` with a conditional
+    UPDATE (`WHERE status = from_status`), so a concurrent change is never
+    overwritten, and log every change. `changes` are extra fields updated along.
+    Returns the ids of the orders that moved.
+    """
+    if not can_transition(from_status, to_status):
+        raise ValidationError(
+            {
+                "detail": _("Order status can not change from %(from)s to %(to)s")
+                % {"from": Status(from_status).label, "to": Status(to_status).label}
+            }
+        )
+
+    order_ids = list(
+        orders.select_for_update()
+        .filter(status=from_status)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    if not order_ids:
+        return []
+
+    Order.objects.filter(pk__in=order_ids, status=from_status).update(
+        status=to_status, **changes
+    )
+    OrderStatusTransition.objects.bulk_create(
+        OrderStatusTransition(
+            order_id=order_id,
+            from_status=from_status,
+            to_status=to_status,
+            changed_by=changed_by,
+        )
+        for order_id in order_ids
+    )
+    return order_ids
+
+
+def transition_order(
+    order: Order, to_status: str, changed_by: User | None = None
+) -> Order:
+    """
+    Move `order` from the status it was loaded with to `to_status`. Raises a
+    `ValidationError` when the order changed status in the meantime.
+    """
+    if not transition_orders(
+        Order.objects.filter(pk=order.pk), order.status, to_status, changed_by
+    ):
+        raise ValidationError(
+            {"detail": _("Order status has changed in the meantime, try again")}
+        )
+    order.status = to_status
+    return order
@@ -16,11 +16,21 @@ urlpatterns = [
         views.OrderItemListAPIView.as_view(),
         name="order-item-list",
     ),
+    path(
+        "<uuid:order_id>/items/bulk/",
+        views.OrderItemBulkAPIView.as_view(),
+        name="order-item-bulk",
+    ),
     path(
         "<uuid:order_id>/items/<uuid:pk>/",
         views.OrderItemDetailAPIView.as_view(),
         name="order-item-detail",
     ),
+    path(
+        "payments/webhook/",
+        views.PaymentWebhookAPIView.as_view(),
+        name="payment-webhook",
+    ),
     path(
         "<uuid:pk>/pay/",
         views.OrderPayAPIView.as_view(),
@@ -1,44 +1,61 @@
-from django.db.models import Count
+from hashlib import sha256
+
+from django.db import IntegrityError, transaction
 from django.utils.translation import gettext_lazy as _
 from rest_framework import status
+from rest_framework.exceptions import APIException
 from rest_framework.generics import (
     GenericAPIView,
     ListCreateAPIView,
     RetrieveUpdateDestroyAPIView,
 )
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.views import APIView
 
+from core.pagination import KeysetCursorPagination
 from orders.models import Order, OrderItem
 from orders.serializers import (
+    OrderItemBulkSerializer,
     OrderItemDetailSerializer,
     OrderItemListSerializer,
     OrderSerializer,
     PaymentSerializer,
 )
-from orders.services import complete_order_payment
+from orders.services import (
+    bulk_add_order_items,
+    complete_order_payment,
+    delete_order_item,
+    handle_webhook,
+    run_idempotent,
+)
 
 
 class OrderListAPIView(ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderSerializer
+    pagination_class = KeysetCursorPagination
 
     def get_queryset(self):  # type: ignore
-        return Order.objects.prefetch_related("items").filter(user=self.request.user)
+        return Order.objects.with_details().filter(user=self.request.user)
 
     def create(self, request, *args, **kwargs):
-        empty_order = (
-            request.user.orders.filter(status=Order.Status.WAITING_PAYMENT)
-            .annotate(item_count=Count("items"))
-            .filter(item_count=0)
-            .first()
-        )
+        # A user has at most one open cart, found through the partial unique
+        # index `unique_open_cart_per_user`
+        if cart := self.get_open_cart():
+            serializer = self.get_serializer(cart)
+            return Response(serializer.data, status=status.HTTP_200_OK)
 
-        if empty_order:
-            serializer = self.get_serializer(empty_order)
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            # A concurrent request created the cart first
+            serializer = self.get_serializer(self.get_open_cart())
             return Response(serializer.data, status=status.HTTP_200_OK)
 
-        return super().create(request, *args, **kwargs)
+    def get_open_cart(self) -> Order | None:
+        return self.get_queryset().filter(status=Order.Status.WAITING_PAYMENT).first()
 
 
 class OrderDetailAPIView(RetrieveUpdateDestroyAPIView):
@@ -47,7 +64,7 @@ class OrderDetailAPIView(RetrieveUpdateDestroyAPIView):
     http_method_names = ["get", "patch", "delete"]
 
     def get_queryset(self):  # type: ignore
-        return Order.objects.prefetch_related("items").filter(user=self.request.user)
+        return Order.objects.with_details().filter(user=self.request.user)
 
 
 class OrderItemListAPIView(ListCreateAPIView):
@@ -56,8 +73,10 @@ class OrderItemListAPIView(ListCreateAPIView):
 
     def get_queryset(self):  # type: ignore
         order_id = self.kwargs.get("order_id")
-        return OrderItem.objects.select_related("order").filter(
-            order_id=order_id, order__user=self.request.user
+        return (
+            OrderItem.objects.with_details()
+            .select_related("order")
+            .filter(order_id=order_id, order__user=self.request.user)
         )
 
     def get_serializer_context(self):
@@ -71,6 +90,29 @@ class OrderItemListAPIView(ListCreateAPIView):
         return context
 
 
+class OrderItemBulkAPIView(GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = OrderItemBulkSerializer
+    lookup_url_kwarg = "order_id"
+
+    def get_queryset(self):  # type: ignore
+        return Order.objects.filter(user=self.request.user)
+
+    def post(self, request, *args, **kwargs):
+        order = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        items = bulk_add_order_items(order, serializer.validated_data["items"])
+        serializer = OrderItemListSerializer(
+            OrderItem.objects.with_details().filter(pk__in=[item.pk for item in items]),
+            many=True,
+            context=self.get_serializer_context(),
+        )
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
 class OrderItemDetailAPIView(RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderItemDetailSerializer
@@ -78,10 +120,15 @@ class OrderItemDetailAPIView(RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):  # type: ignore
         order_id = self.kwargs.get("order_id")
-        return OrderItem.objects.select_related("order").filter(
-            order_id=order_id, order__user=self.request.user
+        return (
+            OrderItem.objects.with_details()
+            .select_related("order")
+            .filter(order_id=order_id, order__user=self.request.user)
         )
 
+    def perform_destroy(self, instance: OrderItem) -> None:
+        delete_order_item(instance)
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update(
@@ -94,18 +141,64 @@ class OrderItemDetailAPIView(RetrieveUpdateDestroyAPIView):
 
 
 class OrderPayAPIView(GenericAPIView):
+    """
+    Pay for an order. Clients should send an `Idempotency-Key` header, a retry
+    with the same key replays the first response instead of paying again.
+    """
+
     permission_classes = [IsAuthenticated]
     serializer_class = PaymentSerializer
+    IDEMPOTENCY_KEY_MAX_LENGTH = 255
 
     def get_queryset(self):  # type: ignore
-        return Order.objects.prefetch_related("items").filter(user=self.request.user)
+        # Only the payment is serialized, the items are checked in SQL
+        return Order.objects.filter(user=self.request.user)
 
     def post(self, request, *args, **kwargs):
         order = self.get_object()
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        payment_method = serializer.validated_data["method"]
+
+        if (key := request.headers.get("Idempotency-Key")) is None:
+            payment = complete_order_payment(order, payment_method)
+            return Response(
+                self.get_serializer(payment).data, status=status.HTTP_201_CREATED
+            )
+
+        if not key or len(key) > self.IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response(
+                {"detail": _("Invalid Idempotency-Key header")},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        def pay() -> tuple[int, dict]:
+            try:
+                payment = complete_order_payment(order, payment_method)
+            except APIException as e:
+                # Failures are replayed as well, a retry must not pay later
+                return e.status_code, e.detail  # type: ignore
+            return status.HTTP_201_CREATED, self.get_serializer(payment).data
+
+        fingerprint = sha256(
+            f"{request.method} {request.path} {payment_method}".encode()
+        ).hexdigest()
+        response_status, response_data, replayed = run_idempotent(
+            request.user, key, fingerprint, pay
+        )
 
-        payment = complete_order_payment(order, serializer.validated_data["method"])
-        serializer = self.get_serializer(payment)
+        response = Response(response_data, status=response_status)
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class PaymentWebhookAPIView(APIView):
+    """Payment status events from the provider, authenticated by their signature."""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        handle_webhook(request.body, request.headers.get("X-Signature", ""))
+        return Response(status=status.HTTP_204_NO_CONTENT)
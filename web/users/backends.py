@@ -0,0 +1,34 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password, verify_password
+
+from users.hashing import run_hashing
+from users.models import User
+
+
+class HashingPoolModelBackend(ModelBackend):
+    """
+    `ModelBackend` hashing on the pool of `users.hashing`. A password stored
+    with another hasher than the first of `PASSWORD_HASHERS` is rehashed on
+    successful sign-in.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Same work as for an existing user, against user enumeration
+            run_hashing(make_password, password)
+            return None
+
+        is_correct, must_update = run_hashing(verify_password, password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            run_hashing(user.set_password, password)
+            user.save(update_fields=["password"])
+        return user
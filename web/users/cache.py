@@ -0,0 +1,144 @@
+import copy
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+
+from users.models import User
+
+
+class LocalUserCache:
+    """
+    Bounded LRU of users with a time to live, private to the process. Entries
+    keep the version of the user they were loaded at, see `get_cached_user`.
+    """
+
+    def __init__(self) -> None:
+        self.entries: OrderedDict[str, tuple[float, int, User]] = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key: str) -> tuple[int, User] | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key: str, version: int, user: User) -> None:
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + settings.USER_CACHE_TTL,
+                version,
+                user,
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.USER_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+local_users = LocalUserCache()
+
+_stats = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+_stats_lock = Lock()
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _key(user_id: Any) -> str:
+    return f"auth:user:{user_id}"
+
+
+def _version_key(user_id: Any) -> str:
+    return f"auth:user-version:{user_id}"
+
+
+def get_cached_user(user_id: Any) -> User | None:
+    """
+    User `user_id` from the process cache, then the shared cache, then the
+    database. Returns a copy, so that changes made while handling a request
+    never leak into the cached instance.
+
+    Entries, in the process or the shared cache, are only used while the
+    user's version in the shared cache is the one they were loaded at, so a
+    change made through any process applies to every other one on its next
+    request. That costs one shared cache read per request, still no query.
+    """
+    key, version_key = _key(user_id), _version_key(user_id)
+
+    entry = local_users.get(key)
+    if entry is not None:
+        version = cache.get(version_key, 0)
+        if entry[0] == version:
+            _count("local_hits")
+            return copy.copy(entry[1])
+        values = {version_key: version, key: cache.get(key)}
+    else:
+        values = cache.get_many([key, version_key])
+    # Read before the user, a change in between leaves an older version behind
+    version = values.get(version_key, 0)
+
+    shared = values.get(key)
+    if shared is not None and shared[0] == version:
+        _count("shared_hits")
+        user = shared[1]
+    else:
+        _count("misses")
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, (version, user), timeout=settings.USER_CACHE_SHARED_TTL)
+
+    local_users.set(key, version, user)
+    return copy.copy(user)
+
+
+def invalidate_cached_user(user_id: Any) -> None:
+    key, version_key = _key(user_id), _version_key(user_id)
+    local_users.delete(key)
+    cache.delete(key)
+    # Retires the entries of the other processes
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.add(version_key, 0, timeout=None)
+        cache.incr(version_key)
+
+
+def get_user_cache_stats() -> dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = sum(stats.values())
+    return {
+        **stats,
+        "size": len(local_users),
+        "hit_rate": (
+            (stats["local_hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        ),
+    }
+
+
+def reset_user_cache() -> None:
+    local_users.clear()
+    with _stats_lock:
+        _stats.update(dict.fromkeys(_stats, 0))
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import Callable, TypeVar
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+T = TypeVar("T")
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("Too many sign-ins at the moment, try again shortly")
+    default_code = "password_hashing_busy"
+
+
+_executor: ThreadPoolExecutor | None = None
+_slots: BoundedSemaphore | None = None
+_lock = Lock()
+
+
+def get_hashing_pool() -> tuple[ThreadPoolExecutor, BoundedSemaphore]:
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            # hashlib releases the GIL while hashing, the other threads of the
+            # worker keep serving requests
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_WORKERS,
+                thread_name_prefix="password-hashing",
+            )
+            _slots = BoundedSemaphore(
+                settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_QUEUE
+            )
+        return _executor, _slots  # type: ignore
+
+
+def run_hashing(function: Callable[..., T], *args) -> T:
+    """
+    Run the password hashing `function` on the bounded hashing pool and wait
+    for it. Raises `PasswordHashingBusy` (503) right away when
+    `PASSWORD_HASHING_QUEUE` calls are already waiting for a thread, instead
+    of piling requests up behind a burst of sign-ins.
+    """
+    executor, slots = get_hashing_pool()
+    if not slots.acquire(blocking=False):
+        raise PasswordHashingBusy()
+    try:
+        future = executor.submit(function, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future.result()
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from users.revocation import purge_revoked_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete revoked tokens that have expired anyway."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of tokens deleted per query.",
+        )
+
+    def handle(self, *args, batch_size: int, **options):
+        deleted = purge_revoked_tokens(batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} expired revoked tokens")
+        )
@@ -50,3 +50,29 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self) -> str:
         return f"{self.email}"
+
+
+class RevokedToken(models.Model):
+    """
+    JWT revoked before its expiry, by logout or because it leaked. Workers keep
+    the ids in a filter synced from this table, see `users.revocation`.
+    """
+
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="revoked_tokens",
+        blank=True,
+        null=True,
+    )
+    # Expiry of the token itself, the row is useless afterwards
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = _("Revoked Token")
+        verbose_name_plural = _("Revoked Tokens")
+
+    def __str__(self) -> str:
+        return self.jti
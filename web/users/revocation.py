@@ -0,0 +1,147 @@
+import math
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from hashlib import blake2b
+from threading import Lock
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+from users.models import RevokedToken, User
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter of strings. `in` never misses an added item and
+    is wrong for other items with probability about `error_rate` while no
+    more than `capacity` items were added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> range:
+        # Double hashing, k positions out of a single digest
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return range(first, first + self.hashes * step, step)
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            position %= self.size
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        for position in self._positions(item):
+            position %= self.size
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class RevocationFilter:
+    """
+    Revoked token ids of this process. Rows created since the last sync are
+    added every `TOKEN_REVOCATION_SYNC_INTERVAL` seconds and the filter is
+    rebuilt from the live rows every `TOKEN_REVOCATION_REBUILD_INTERVAL`
+    seconds, dropping expired tokens.
+    """
+
+    # Rows are read again for this long after the newest one seen, to catch
+    # rows of transactions that committed out of order
+    SYNC_OVERLAP = timedelta(minutes=1)
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.bloom = self._new_bloom()
+        self.synced_until: datetime | None = None
+        self.next_sync = 0.0
+        self.next_rebuild = 0.0
+
+    def _new_bloom(self) -> BloomFilter:
+        return BloomFilter(
+            settings.TOKEN_REVOCATION_CAPACITY, settings.TOKEN_REVOCATION_ERROR_RATE
+        )
+
+    def add(self, jti: str) -> None:
+        self.bloom.add(jti)
+
+    def might_contain(self, jti: str) -> bool:
+        now = time.monotonic()
+        # Only one thread syncs, the others go on with the current filter
+        if now >= self.next_sync and self.lock.acquire(blocking=False):
+            try:
+                self._sync(now)
+            finally:
+                self.lock.release()
+        return jti in self.bloom
+
+    def _sync(self, now: float) -> None:
+        rows = RevokedToken.objects.filter(expires_at__gt=timezone.now())
+        if now >= self.next_rebuild:
+            bloom, synced_until = self._new_bloom(), None
+            self.next_rebuild = now + settings.TOKEN_REVOCATION_REBUILD_INTERVAL
+        else:
+            bloom, synced_until = self.bloom, self.synced_until
+            if synced_until is not None:
+                rows = rows.filter(created_at__gte=synced_until - self.SYNC_OVERLAP)
+
+        for jti, created_at in rows.values_list("jti", "created_at").iterator():
+            bloom.add(jti)
+            if synced_until is None or created_at > synced_until:
+                synced_until = created_at
+
+        self.bloom, self.synced_until = bloom, synced_until
+        self.next_sync = now + settings.TOKEN_REVOCATION_SYNC_INTERVAL
+
+
+revocation_filter = RevocationFilter()
+
+
+def is_token_revoked(jti: str) -> bool:
+    """
+    Whether the token `jti` is revoked. No query unless the filter matches,
+    then the table confirms, so a false positive never rejects a token.
+    """
+    if not revocation_filter.might_contain(jti):
+        return False
+    return RevokedToken.objects.filter(jti=jti).exists()
+
+
+def revoke_token(token: Token, user: User | None = None) -> None:
+    jti = token[api_settings.JTI_CLAIM]
+    expires_at = datetime.fromtimestamp(token["exp"], tz=dt_timezone.utc)
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, user=user, expires_at=expires_at)
+    except IntegrityError:
+        # Already revoked
+        pass
+    transaction.on_commit(lambda: revocation_filter.add(jti))
+
+
+def purge_revoked_tokens(batch_size: int = 1000) -> int:
+    """Delete the rows of tokens that expired anyway, returns how many were deleted."""
+    expired_qs = RevokedToken.objects.filter(expires_at__lte=timezone.now())
+
+    deleted = 0
+    while pks := list(expired_qs.values_list("pk", flat=True)[:batch_size]):
+        deleted += RevokedToken.objects.filter(pk__in=pks).delete()[0]
+    return deleted
+
+
+def reset_revocation_filter() -> None:
+    revocation_filter.reset()
@@ -1,6 +1,15 @@
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenRefreshSerializer as BaseTokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from users.hashing import run_hashing
 from users.models import User
+from users.revocation import is_token_revoked
 
 
 class BaseUserSerializer(serializers.ModelSerializer):
@@ -38,7 +47,7 @@ class UserCreateSerializer(BaseUserSerializer):
     def create(self, validated_data: dict):
         password = validated_data["password"]
         user = User(**validated_data)
-        user.set_password(password)
+        run_hashing(user.set_password, password)
         user.save()
         return user
 
@@ -64,3 +73,26 @@ class UserDetailSerializer(BaseUserSerializer):
             representation.pop(field, None)
 
         return representation
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """Refuses refresh tokens revoked by a logout."""
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs["refresh"])
+        if is_token_revoked(refresh[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is revoked"))
+        return super().validate(attrs)
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
+
+    def validate_refresh(self, value: str) -> RefreshToken:
+        try:
+            refresh = RefreshToken(value)
+        except TokenError as e:
+            raise serializers.ValidationError(str(e))
+        if str(refresh.get(api_settings.USER_ID_CLAIM)) != str(self.context["request"].user.pk):
+            raise serializers.ValidationError(_("Token belongs to another user"))
+        return refresh
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.cache import invalidate_cached_user
+from users.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache_on_change(sender, instance: User, **kwargs) -> None:
+    # After the commit, so that a concurrent request can not put the old row
+    # back in the meantime. The pk is taken now, `delete()` clears it
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
@@ -1,12 +1,33 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
-from users.models import User
+from core.tests import ServedThroughASGIMixin
+from core.throttling import get_bucket_store
+from users.cache import (
+    LocalUserCache,
+    get_user_cache_stats,
+    local_users,
+    reset_user_cache,
+)
+from users.hashing import get_hashing_pool
+from users.models import RevokedToken, User
+from users.revocation import BloomFilter, reset_revocation_filter, revocation_filter
 
 
 class UserAPITestCase(APITestCase):
     def setUp(self):
+        get_bucket_store().clear()
         self.user_payload = {
             "email": "newuser@mail.com",
             "password": "12345",
@@ -57,3 +78,279 @@ class UserAPITestCase(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+
+    @override_settings(RATE_LIMITS={"register": "2/hour"})
+    def test_user_register_rate_limit_ignores_spoofed_forwarded_for(self):
+        self.user.delete()
+        self.client.force_authenticate(user=None)
+        url = reverse("users:register")
+
+        statuses = []
+        for i in range(3):
+            # What nginx forwards: the header sent by the client, then the
+            # address the request came from
+            forwarded_for = f"10.0.0.{i}, 203.0.113.7"
+            response = self.client.post(
+                url, self.user_payload, HTTP_X_FORWARDED_FOR=forwarded_for
+            )
+            statuses.append(response.status_code)
+            User.objects.filter(email=self.user_payload["email"]).delete()
+
+        self.assertEqual(statuses[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.post(
+            url, self.user_payload, HTTP_X_FORWARDED_FOR="203.0.113.8"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(RATE_LIMITS={"register": "2/hour"})
+    def test_user_register_rate_limited(self):
+        self.user.delete()
+        url = reverse("users:register")
+
+        response = self.client.post(url, self.user_payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["RateLimit-Limit"], "2")
+        self.assertEqual(response["RateLimit-Remaining"], "1")
+        self.assertEqual(response["RateLimit-Reset"], "1800")
+        self.client.post(url, self.user_payload)
+
+        response = self.client.post(url, self.user_payload)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["RateLimit-Remaining"], "0")
+        self.assertEqual(response["Retry-After"], "1800")
+
+
+class UserCacheTestCase(APITestCase):
+    def setUp(self):
+        reset_user_cache()
+        reset_revocation_filter()
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="cached@mail.com",
+            password="12345",
+            first_name="Cached",
+            last_name="User",
+            phone="+48123456780",
+        )
+        self.token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        self.url = reverse("users:profile")
+
+    def test_user_resolved_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data["email"], self.user.email)
+
+        # Another process, the shared cache still has the user
+        local_users.clear()
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        stats = get_user_cache_stats()
+        self.assertEqual(
+            [stats["misses"], stats["local_hits"], stats["shared_hits"]], [1, 1, 1]
+        )
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+
+    def test_user_change_invalidates_cache(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url, {"first_name": "Jane"})
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["first_name"], "Jane")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(self.url)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_applies_to_other_processes(self):
+        # `User` has no `is_active` column, losing staff is the change to follow
+        url = reverse("users:user-cache-stats")
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        other_process = mock.patch("users.cache.local_users", LocalUserCache())
+
+        # Both processes have the user in their own cache
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with other_process:
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+            self.user.is_staff = False
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_user_cache_stats_admin_only(self):
+        url = reverse("users:user-cache-stats")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("hit_rate", response.data)
+
+
+class AsyncProfileTestCase(ServedThroughASGIMixin, APITestCase):
+    """The async profile views, served on an event loop as under ASGI."""
+
+    def setUp(self):
+        reset_user_cache()
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="async@mail.com",
+            password="12345",
+            first_name="Async",
+            last_name="User",
+            phone="+48123456780",
+        )
+        self.token = AccessToken.for_user(self.user)
+        self.url = reverse("users:profile")
+
+    async def test_profile_on_event_loop(self):
+        headers = {"Authorization": f"Bearer {self.token}"}
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertEqual(response.json()["email"], self.user.email)
+
+        response = await self.async_client.patch(
+            self.url, {"first_name": "Jane"}, content_type="application/json", headers=headers
+        )
+        self.assertEqual(response.json()["first_name"], "Jane")
+
+        url = reverse("users:user-detail", kwargs={"pk": self.user.pk})
+        response = await self.async_client.get(url)
+        self.assertEqual(response.json()["first_name"], "Jane")
+
+
+class TokenRevocationTestCase(APITestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        reset_revocation_filter()
+        self.user = User.objects.create_user(
+            email="revoked@mail.com",
+            password="12345",
+            first_name="Revoked",
+            last_name="User",
+            phone="+48123456781",
+        )
+        response = self.client.post(
+            reverse("users:login"), {"email": "revoked@mail.com", "password": "12345"}
+        )
+        self.access, self.refresh = response.data["access"], response.data["refresh"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"revoked-{i}")
+
+        self.assertTrue(all(f"revoked-{i}" in bloom for i in range(1000)))
+        false_positives = sum(f"valid-{i}" in bloom for i in range(10_000))
+        self.assertLess(false_positives, 300)
+
+    def test_logout_revokes_tokens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("users:logout"), {"refresh": self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(RevokedToken.objects.filter(user=self.user).count(), 2)
+
+        response = self.client.get(reverse("users:profile"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(
+            reverse("users:token-refresh"), {"refresh": self.refresh}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_refuses_refresh_token_of_another_user(self):
+        other = User.objects.create_user(
+            email="other@mail.com", password="12345", phone="+48123456782"
+        )
+        response = self.client.post(
+            reverse("users:logout"), {"refresh": str(RefreshToken.for_user(other))}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(RevokedToken.objects.exists())
+
+    def test_token_revoked_by_another_worker(self):
+        self.client.get(reverse("users:profile"))
+        # Revoked elsewhere, this process learns about it at its next sync
+        token = AccessToken(self.access)
+        RevokedToken.objects.create(
+            jti=token["jti"], user=self.user, expires_at=timezone.now() + timedelta(days=7)
+        )
+        revocation_filter.next_sync = 0
+
+        response = self.client.get(reverse("users:profile"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_false_positive_checked_in_database(self):
+        self.client.get(reverse("users:profile"))
+        revocation_filter.add(AccessToken(self.access)["jti"])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("users:profile"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_purge_revoked_tokens(self):
+        RevokedToken.objects.create(jti="expired", expires_at=timezone.now())
+        RevokedToken.objects.create(
+            jti="live", expires_at=timezone.now() + timedelta(days=1)
+        )
+
+        out = StringIO()
+        call_command("purge_revoked_tokens", stdout=out)
+
+        self.assertIn("Deleted 1 expired revoked tokens", out.getvalue())
+        self.assertEqual(list(RevokedToken.objects.values_list("jti", flat=True)), ["live"])
+
+
+class PasswordHashingTestCase(APITestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        self.user = User.objects.create_user(
+            email="hashing@mail.com",
+            password="12345",
+            first_name="Hashing",
+            last_name="User",
+            phone="+48123456783",
+        )
+        self.credentials = {"email": "hashing@mail.com", "password": "12345"}
+
+    def test_login_upgrades_password_hash(self):
+        self.assertTrue(self.user.password.startswith("scrypt$"))
+        self.user.password = make_password("12345", hasher="pbkdf2_sha256")
+        self.user.save()
+
+        response = self.client.post(reverse("users:login"), self.credentials)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("scrypt$"))
+        self.assertTrue(self.user.check_password("12345"))
+
+    def test_login_wrong_password(self):
+        response = self.client.post(
+            reverse("users:login"), {**self.credentials, "password": "wrong"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_fails_fast_when_hashing_is_saturated(self):
+        _, slots = get_hashing_pool()
+        taken = 0
+        while slots.acquire(blocking=False):
+            taken += 1
+        try:
+            response = self.client.post(reverse("users:login"), self.credentials)
+        finally:
+            for _ in range(taken):
+                slots.release()
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        response = self.client.post(reverse("users:login"), self.credentials)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -1,8 +1,15 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from core.views import interface_view
 from users.views import (
+    AsyncUserDetailAPIView,
+    AsyncUserProfileAPIView,
+    LoginAPIView,
+    LogoutAPIView,
+    TokenRefreshAPIView,
     UserDetailAPIView,
     UserProfileAPIView,
+    UserCacheStatsAPIView,
     UserRegisterAPIView,
 )
 
@@ -10,8 +17,18 @@ app_name = "users"
 
 urlpatterns = [
     path("", UserRegisterAPIView.as_view(), name="register"),
-    path("profile/", UserProfileAPIView.as_view(), name="profile"),
-    path("<uuid:pk>/", UserDetailAPIView.as_view(), name="user-detail"),
-    path("login/", TokenObtainPairView.as_view(), name="login"),
-    path("token-refresh/", TokenRefreshView.as_view(), name="token-refresh"),
+    path(
+        "profile/",
+        interface_view(UserProfileAPIView, AsyncUserProfileAPIView),
+        name="profile",
+    ),
+    path(
+        "<uuid:pk>/",
+        interface_view(UserDetailAPIView, AsyncUserDetailAPIView),
+        name="user-detail",
+    ),
+    path("login/", LoginAPIView.as_view(), name="login"),
+    path("token-refresh/", TokenRefreshAPIView.as_view(), name="token-refresh"),
+    path("logout/", LogoutAPIView.as_view(), name="logout"),
+    path("user-cache/stats/", UserCacheStatsAPIView.as_view(), name="user-cache-stats"),
 ]
@@ -1,16 +1,27 @@
+from asgiref.sync import sync_to_async
 from rest_framework import status
-from rest_framework.generics import RetrieveAPIView, CreateAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.generics import CreateAPIView, RetrieveAPIView
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from core.views import AsyncAPIView, AsyncRetrieveAPIView
+
+from users.cache import get_user_cache_stats
 from users.models import User
-from users.serializers import UserCreateSerializer, UserDetailSerializer
+from users.revocation import revoke_token
+from users.serializers import (
+    LogoutSerializer,
+    UserCreateSerializer,
+    UserDetailSerializer,
+)
 
 
 class UserRegisterAPIView(CreateAPIView):
     queryset = User.objects.all()
     permission_classes = []
+    throttle_scope = "register"
     serializer_class = UserCreateSerializer
 
 
@@ -38,7 +49,62 @@ class UserProfileAPIView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class AsyncUserProfileAPIView(AsyncAPIView, UserProfileAPIView):
+    """Served instead under ASGI: reads on the event loop, writes in a thread."""
+
+    async def get(self, request, *args, **kwargs):
+        # `request.user` comes from `users.cache`, no query
+        return super().get(request, *args, **kwargs)
+
+    async def patch(self, request, *args, **kwargs):
+        return await sync_to_async(super().patch)(request, *args, **kwargs)
+
+    async def delete(self, request, *args, **kwargs):
+        return await sync_to_async(super().delete)(request, *args, **kwargs)
+
+
 class UserDetailAPIView(RetrieveAPIView):
     queryset = User.objects.all()
     permission_classes = []
+    throttle_scope = "user-detail"
     serializer_class = UserDetailSerializer
+
+
+class AsyncUserDetailAPIView(AsyncRetrieveAPIView, UserDetailAPIView):
+    pass
+
+
+class LoginAPIView(TokenObtainPairView):
+    throttle_scope = "login"
+
+
+class TokenRefreshAPIView(TokenRefreshView):
+    throttle_scope = "login"
+
+
+class LogoutAPIView(APIView):
+    """Revoke the access token of the request, and the refresh token if given."""
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = LogoutSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+
+        if request.auth is not None:
+            revoke_token(request.auth, request.user)
+        if refresh := serializer.validated_data.get("refresh"):
+            revoke_token(refresh, request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UserCacheStatsAPIView(APIView):
+    """Hit rate of the authentication user cache, of the process serving the request."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_user_cache_stats(), status=status.HTTP_200_OK)